@@ -65,6 +65,13 @@ async function uploadFile(file) {
         return;
     }
 
+    // Оценки прошлого документа отправляем сейчас: новые карточки относятся к новому.
+    // Оценки без ID документа (прошлая загрузка не дошла до "done") сохранить нельзя
+    clearTimeout(reviewFlushTimer);
+    flushReviews();
+    pendingReviews = [];
+    currentDocument = null;
+
     // Показываем загрузку
     loading.style.display = 'block';
     result.style.display = 'none';
@@ -73,8 +80,8 @@ async function uploadFile(file) {
     formData.append('file', file);
 
     try {
-        // РЕАЛЬНЫЙ ЗАПРОС К БЭКЕНДУ
-        const response = await fetch('/upload', {
+        // Потоковый запрос: разделы появляются по мере готовности
+        const response = await fetch('/upload/stream', {
             method: 'POST',
             body: formData
         });
@@ -83,15 +90,31 @@ async function uploadFile(file) {
             throw new Error(`Ошибка сервера: ${response.status}`);
         }
 
-        const data = await response.json();
-
-        if (data.status === 'error') {
-            throw new Error(data.error || 'Неизвестная ошибка');
-        }
+        await readEventStream(response, (event, data) => {
+            if (event === 'error') {
+                throw new Error(data.error || 'Неизвестная ошибка');
+            }
+            if (event === 'done') {
+                // Markdown не приходит в потоке — забираем его, если экспорт уже открыт
+                currentDocument = data;
+                // Оценки, поставленные до "done", получают ID этого документа
+                pendingReviews.forEach(review => {
+                    if (review.documentId === null) review.documentId = data.document_id;
+                });
+                if (document.getElementById('exportTab')?.classList.contains('active')) {
+                    loadMarkdown();
+                }
+            }
+            if (event === 'entities') {
+                // Первый контент: убираем спиннер и рисуем каркас
+                loading.style.display = 'none';
+                renderSkeleton();
+                result.style.display = 'block';
+            }
+            const render = STREAM_RENDERERS[event];
+            if (render) render(data);
+        });
 
-        loading.style.display = 'none';
-        displayStructuredData(data);
-        result.style.display = 'block';
         showNotification('Файл успешно обработан ИИ!', 'success');
 
     } catch (error) {
@@ -101,56 +124,88 @@ async function uploadFile(file) {
     }
 }
 
-// Отображение структурированных данных
-function displayStructuredData(data) {
-    const container = document.getElementById('structuredData');
+// Чтение потока Server-Sent Events из fetch-ответа
+async function readEventStream(response, onEvent) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        let separator;
+        while ((separator = buffer.indexOf('\n\n')) !== -1) {
+            const raw = buffer.slice(0, separator);
+            buffer = buffer.slice(separator + 2);
+
+            let event = 'message';
+            let data = '';
+            raw.split('\n').forEach(line => {
+                if (line.startsWith('event: ')) event = line.slice(7);
+                else if (line.startsWith('data: ')) data += line.slice(6);
+            });
+            onEvent(event, data ? JSON.parse(data) : null);
+        }
+    }
+}
 
-    if (!container) return;
+// Документ последней загрузки: ссылки на артефакты, которые забираются по запросу
+let currentDocument = null;
 
-    if (!data.all_materials) {
-        container.innerHTML = `<div class="error">Материалы не созданы. Попробуйте снова.</div>`;
-        return;
+async function fetchArtifact(name) {
+    const response = await fetch(currentDocument.artifacts[name]);
+    if (!response.ok) {
+        throw new Error(`Ошибка сервера: ${response.status}`);
+    }
+    return name === 'markdown' ? response.text() : response.json();
+}
+
+async function loadMarkdown() {
+    if (!currentDocument || currentDocument.markdownLoaded) return;
+    currentDocument.markdownLoaded = true;
+    try {
+        renderMarkdown(await fetchArtifact('markdown'));
+    } catch (error) {
+        currentDocument.markdownLoaded = false;
+        showNotification('Ошибка: ' + error.message, 'error');
     }
+}
 
-    const m = data.all_materials;
+// Какой раздел отрисовывает каждое событие потока
+const STREAM_RENDERERS = {
+    entities: renderEntityStats,
+    study_guide: renderStudyGuide,
+    flashcards: renderFlashcards,
+    test: renderTest,
+    markdown: renderMarkdown,
+    content_analysis: renderContentAnalysis,
+    specialized_content: renderSpecializedContent,
+    stats: renderStats
+};
+
+function pendingBlock(text) {
+    return `<p class="pending"><i class="fas fa-spinner fa-spin"></i> ${text}</p>`;
+}
 
-    let html = `
-        <div class="stats">
-            <div class="stat-item">
-                <span class="stat-number">${m.stats.total_characters}</span>
-                <span class="stat-label">персонажей</span>
-            </div>
-            <div class="stat-item">
-                <span class="stat-number">${m.stats.total_events}</span>
-                <span class="stat-label">событий</span>
-            </div>
-            <div class="stat-item">
-                <span class="stat-number">${m.stats.total_flashcards}</span>
-                <span class="stat-label">карточек</span>
-            </div>
-            <div class="stat-item">
-                <span class="stat-number">${m.stats.total_questions}</span>
-                <span class="stat-label">вопросов</span>
-            </div>
-        </div>
+function setHtml(id, html) {
+    const el = document.getElementById(id);
+    if (el) el.innerHTML = html;
+}
+
+// Каркас результата: разделы заполняются по мере поступления данных
+function renderSkeleton() {
+    const container = document.getElementById('structuredData');
+    if (!container) return;
+
+    container.innerHTML = `
+        <div class="stats" id="statsBlock"></div>
         
         <!-- Анализ типа контента -->
-        <div class="content-analysis">
+        <div class="content-analysis" id="analysisBlock">
             <h3><i class="fas fa-search"></i> Анализ контента</h3>
-            <div class="analysis-card" data-type="${data.content_analysis.primary_type}">
-                <p><strong><i class="fas fa-tag"></i> Тип:</strong> ${data.content_analysis.primary_type}</p>
-                <p><strong><i class="fas fa-chart-line"></i> Уверенность:</strong> ${Math.round(data.content_analysis.confidence * 100)}%</p>
-                <p><strong><i class="fas fa-lightbulb"></i> Рекомендация:</strong> ${data.content_analysis.reason}</p>
-                
-                ${data.content_analysis.secondary_types && data.content_analysis.secondary_types.length > 0 ?
-            `<p><strong><i class="fas fa-layer-group"></i> Дополнительные типы:</strong> ${data.content_analysis.secondary_types.join(', ')}</p>`
-            : ''}
-                
-                <!-- Кнопка для расширенного режима -->
-                <button class="advanced-btn" onclick="showAdvancedOptions('${data.content_analysis.primary_type}')">
-                    <i class="fas fa-gamepad"></i> Расширенные игровые форматы
-                </button>
-            </div>
+            ${pendingBlock('Определяем тип контента...')}
         </div>
         
         <div class="materials-tabs">
@@ -169,172 +224,242 @@ function displayStructuredData(data) {
             </button>
         </div>
         
-        <!-- Конспект -->
-        <div id="guideTab" class="mat-content active">
-            <h2><i class="fas fa-graduation-cap"></i> ${m.study_guide.title}</h2>
-            <p class="timestamp"><i class="far fa-clock"></i> Создано: ${m.study_guide.created_at}</p>
+        <div id="guideTab" class="mat-content active">${pendingBlock('Готовим конспект...')}</div>
+        <div id="cardsTab" class="mat-content">${pendingBlock('Готовим карточки...')}</div>
+        <div id="testTab" class="mat-content">${pendingBlock('Подбираем варианты ответов...')}</div>
+        <div id="narrativeTab" class="mat-content">${pendingBlock('Пишем сюжет...')}</div>
+        <div id="exportTab" class="mat-content">${pendingBlock('Готовим Markdown...')}</div>
+    `;
+}
+
+function statItem(value, label) {
+    return `
+        <div class="stat-item">
+            <span class="stat-number">${value}</span>
+            <span class="stat-label">${label}</span>
+        </div>
+    `;
+}
+
+// Предварительная статистика сразу после извлечения сущностей
+function renderEntityStats(structuredData) {
+    setHtml('statsBlock', `
+        ${statItem((structuredData.characters || []).length, 'персонажей')}
+        ${statItem((structuredData.events || []).length, 'событий')}
+        ${statItem('…', 'карточек')}
+        ${statItem('…', 'вопросов')}
+    `);
+}
+
+function renderStats(stats) {
+    setHtml('statsBlock', `
+        ${statItem(stats.total_characters, 'персонажей')}
+        ${statItem(stats.total_events, 'событий')}
+        ${statItem(stats.total_flashcards, 'карточек')}
+        ${statItem(stats.total_questions, 'вопросов')}
+    `);
+}
+
+function renderContentAnalysis(analysis) {
+    setHtml('analysisBlock', `
+        <h3><i class="fas fa-search"></i> Анализ контента</h3>
+        <div class="analysis-card" data-type="${analysis.primary_type}">
+            <p><strong><i class="fas fa-tag"></i> Тип:</strong> ${analysis.primary_type}</p>
+            <p><strong><i class="fas fa-chart-line"></i> Уверенность:</strong> ${Math.round(analysis.confidence * 100)}%</p>
+            <p><strong><i class="fas fa-lightbulb"></i> Рекомендация:</strong> ${analysis.reason}</p>
             
-            ${m.study_guide.sections.map(section => `
-                <div class="section">
-                    <h3><i class="fas ${getSectionIcon(section.type)}"></i> ${section.title}</h3>
-                    ${section.items.map(item => `
-                        <div class="item">
-                            ${item.name ? `<h4><i class="fas ${getItemIcon(section.type)}"></i> ${item.name}</h4>` : ''}
-                            ${item.role ? `<p><strong><i class="fas fa-user-tag"></i> Роль:</strong> ${item.role}</p>` : ''}
-                            ${item.description ? `<p>${item.description}</p>` : ''}
-                            ${item.participants ? `<p><strong><i class="fas fa-users"></i> Участники:</strong> ${item.participants.join(', ')}</p>` : ''}
-                        </div>
-                    `).join('')}
-                </div>
-            `).join('')}
+            ${analysis.secondary_types && analysis.secondary_types.length > 0 ?
+            `<p><strong><i class="fas fa-layer-group"></i> Дополнительные типы:</strong> ${analysis.secondary_types.join(', ')}</p>`
+            : ''}
+            
+            <!-- Кнопка для расширенного режима -->
+            <button class="advanced-btn" onclick="showAdvancedOptions('${analysis.primary_type}')">
+                <i class="fas fa-gamepad"></i> Расширенные игровые форматы
+            </button>
         </div>
+    `);
+    window.contentAnalysis = analysis;
+}
+
+// Конспект
+function renderStudyGuide(guide) {
+    setHtml('guideTab', `
+        <h2><i class="fas fa-graduation-cap"></i> ${guide.title}</h2>
+        <p class="timestamp"><i class="far fa-clock"></i> Создано: ${guide.created_at}</p>
         
-        <!-- Карточки -->
-        <div id="cardsTab" class="mat-content">
-            <h2><i class="fas fa-layer-group"></i> Карточки для запоминания</h2>
-            <p>Нажми на карточку чтобы перевернуть</p>
-            
-            <div id="flashcardsContainer">
-                ${m.flashcards.map((card, index) => `
-                    <div class="flashcard" onclick="flipCard(${index})" id="card${index}">
-                        <div class="front">
-                            <div class="card-content">${card.front}</div>
-                            ${card.hint ? `<div class="hint"><i class="fas fa-lightbulb"></i> ${card.hint}</div>` : ''}
-                        </div>
-                        <div class="back">
-                            <div class="card-content">${card.back}</div>
-                            <div>
-                                <button class="difficulty-btn" onclick="event.stopPropagation(); rateCard(${index}, 1)">
-                                    <i class="fas fa-frown"></i> Трудно
-                                </button>
-                                <button class="difficulty-btn" onclick="event.stopPropagation(); rateCard(${index}, 2)">
-                                    <i class="fas fa-meh"></i> Нормально
-                                </button>
-                                <button class="difficulty-btn" onclick="event.stopPropagation(); rateCard(${index}, 3)">
-                                    <i class="fas fa-smile"></i> Легко
-                                </button>
-                            </div>
-                        </div>
+        ${guide.sections.map(section => `
+            <div class="section">
+                <h3><i class="fas ${getSectionIcon(section.type)}"></i> ${section.title}</h3>
+                ${section.items.map(item => `
+                    <div class="item">
+                        ${item.name ? `<h4><i class="fas ${getItemIcon(section.type)}"></i> ${item.name}</h4>` : ''}
+                        ${item.role ? `<p><strong><i class="fas fa-user-tag"></i> Роль:</strong> ${item.role}</p>` : ''}
+                        ${item.description ? `<p>${item.description}</p>` : ''}
+                        ${item.participants ? `<p><strong><i class="fas fa-users"></i> Участники:</strong> ${item.participants.join(', ')}</p>` : ''}
                     </div>
                 `).join('')}
             </div>
-            
-            <div class="card-controls">
-                <button onclick="prevCard()">
-                    <i class="fas fa-arrow-left"></i> Предыдущая
-                </button>
-                <span id="cardCounter">1 / ${m.flashcards.length}</span>
-                <button onclick="nextCard()">
-                    Следующая <i class="fas fa-arrow-right"></i>
-                </button>
-            </div>
-        </div>
+        `).join('')}
+    `);
+}
+
+// Карточки
+function renderFlashcards(flashcards) {
+    setHtml('cardsTab', `
+        <h2><i class="fas fa-layer-group"></i> Карточки для запоминания</h2>
+        <p>Нажми на карточку чтобы перевернуть</p>
         
-        <!-- Тест -->
-        <div id="testTab" class="mat-content">
-            <h2><i class="fas fa-question-circle"></i> ${m.test.title}</h2>
-            <p>${m.test.description}</p>
-            
-            ${m.test.questions.map((q, index) => `
-                <div class="question">
-                    <h4><i class="far fa-question-circle"></i> Вопрос ${index + 1}: ${q.text}</h4>
-                    
-                    ${q.type === 'choice' ? `
-                        <div class="options">
-                            ${q.options.map((opt, optIndex) => `
-                                <label>
-                                    <input type="radio" name="q${index}" value="${optIndex}">
-                                    ${opt}
-                                </label>
-                            `).join('')}
-                        </div>
-                    ` : ''}
-                    
-                    ${q.type === 'true_false' ? `
-                        <div class="options">
-                            <label><input type="radio" name="q${index}" value="true"> <i class="fas fa-check"></i> Верно</label>
-                            <label><input type="radio" name="q${index}" value="false"> <i class="fas fa-times"></i> Неверно</label>
+        <div id="flashcardsContainer">
+            ${flashcards.map((card, index) => `
+                <div class="flashcard" onclick="flipCard(${index})" id="card${index}">
+                    <div class="front">
+                        <div class="card-content">${card.front}</div>
+                        ${card.hint ? `<div class="hint"><i class="fas fa-lightbulb"></i> ${card.hint}</div>` : ''}
+                    </div>
+                    <div class="back">
+                        <div class="card-content">${card.back}</div>
+                        <div>
+                            <button class="difficulty-btn" onclick="event.stopPropagation(); rateCard(${index}, 1)">
+                                <i class="fas fa-frown"></i> Трудно
+                            </button>
+                            <button class="difficulty-btn" onclick="event.stopPropagation(); rateCard(${index}, 2)">
+                                <i class="fas fa-meh"></i> Нормально
+                            </button>
+                            <button class="difficulty-btn" onclick="event.stopPropagation(); rateCard(${index}, 3)">
+                                <i class="fas fa-smile"></i> Легко
+                            </button>
                         </div>
-                    ` : ''}
+                    </div>
                 </div>
             `).join('')}
-            
-            <button onclick="submitTest()" class="submit-btn">
-                <i class="fas fa-check-circle"></i> Проверить тест
+        </div>
+        
+        <div class="card-controls">
+            <button onclick="prevCard()">
+                <i class="fas fa-arrow-left"></i> Предыдущая
+            </button>
+            <span id="cardCounter">1 / ${flashcards.length}</span>
+            <button onclick="nextCard()">
+                Следующая <i class="fas fa-arrow-right"></i>
             </button>
         </div>
+    `);
+    initCardSystem(flashcards);
+}
+
+// Тест
+function renderTest(test) {
+    setHtml('testTab', `
+        <h2><i class="fas fa-question-circle"></i> ${test.title}</h2>
+        <p>${test.description}</p>
         
-        <!-- Экспорт -->
-        <div id="exportTab" class="mat-content">
-            <h2><i class="fas fa-download"></i> Экспорт в Markdown</h2>
-            <p>Скопируйте этот текст или сохраните в файл</p>
-            
-            <textarea id="markdownContent" readonly>${m.markdown}</textarea>
-            
-            <div class="export-buttons">
-                <button onclick="copyMarkdown()">
-                    <i class="far fa-copy"></i> Копировать
-                </button>
-                <button onclick="downloadMarkdown()">
-                    <i class="fas fa-file-download"></i> Скачать файл
-                </button>
-                <button onclick="printMarkdown()">
-                    <i class="fas fa-print"></i> Печать
-                </button>
-        <div id="narrativeTab" class="mat-content">
-            <h2>🎭 Сюжет и диалоги</h2>
-            
-            ${data.specialized_content?.narrative ? `
-                <!-- Сюжет -->
-                <div class="section">
-                    <h3>📖 Краткий сюжет</h3>
-                    <p>${data.specialized_content.narrative.story}</p>
-                </div>
+        ${test.questions.map((q, index) => `
+            <div class="question">
+                <h4><i class="far fa-question-circle"></i> Вопрос ${index + 1}: ${q.text}</h4>
                 
-                <!-- Диалог -->
-                <div class="section">
-                    <h3>💬 Диалог между персонажами</h3>
-                    <p><strong>Участники:</strong> ${data.specialized_content.narrative.dialog.participants.join(' и ')}</p>
-                    <div class="dialog">
-                        ${data.specialized_content.narrative.dialog.lines.map(line => `
-                            <div class="dialog-line">
-                                <strong>${line.speaker}:</strong> ${line.text}
-                            </div>
+                ${q.type === 'choice' ? `
+                    <div class="options">
+                        ${q.options.map((opt, optIndex) => `
+                            <label>
+                                <input type="radio" name="q${index}" value="${optIndex}">
+                                ${opt}
+                            </label>
                         `).join('')}
                     </div>
-                </div>
+                ` : ''}
                 
-                <!-- Интерактивные вопросы -->
-                <div class="section">
-                    <h3>❓ Интерактивные вопросы</h3>
-                    ${data.specialized_content.narrative.interactive_questions.map((q, index) => `
-                        <div class="question">
-                            <h4>Вопрос ${index + 1}: ${q.question}</h4>
-                            <div class="options">
-                                ${q.options.map((opt, optIndex) => `
-                                    <label>
-                                        <input type="radio" name="narrative_q${index}" value="${optIndex}">
-                                        ${opt}
-                                    </label>
-                                `).join('')}
-                            </div>
+                ${q.type === 'true_false' ? `
+                    <div class="options">
+                        <label><input type="radio" name="q${index}" value="true"> <i class="fas fa-check"></i> Верно</label>
+                        <label><input type="radio" name="q${index}" value="false"> <i class="fas fa-times"></i> Неверно</label>
+                    </div>
+                ` : ''}
+            </div>
+        `).join('')}
+        
+        <button onclick="submitTest()" class="submit-btn">
+            <i class="fas fa-check-circle"></i> Проверить тест
+        </button>
+    `);
+}
+
+// Экспорт
+function renderMarkdown(markdown) {
+    setHtml('exportTab', `
+        <h2><i class="fas fa-download"></i> Экспорт в Markdown</h2>
+        <p>Скопируйте этот текст или сохраните в файл</p>
+        
+        <textarea id="markdownContent" readonly>${markdown}</textarea>
+        
+        <div class="export-buttons">
+            <button onclick="copyMarkdown()">
+                <i class="far fa-copy"></i> Копировать
+            </button>
+            <button onclick="downloadMarkdown()">
+                <i class="fas fa-file-download"></i> Скачать файл
+            </button>
+            <button onclick="printMarkdown()">
+                <i class="fas fa-print"></i> Печать
+            </button>
+        </div>
+    `);
+}
+
+// Сюжет и диалоги
+function renderSpecializedContent(specialized) {
+    // Нужен checkNarrativeAnswers для проверки ответов
+    window.data = { specialized_content: specialized };
+    const narrative = specialized && specialized.narrative;
+
+    setHtml('narrativeTab', `
+        <h2>🎭 Сюжет и диалоги</h2>
+        
+        ${narrative ? `
+            <!-- Сюжет -->
+            <div class="section">
+                <h3>📖 Краткий сюжет</h3>
+                <p>${narrative.story}</p>
+            </div>
+            
+            <!-- Диалог -->
+            <div class="section">
+                <h3>💬 Диалог между персонажами</h3>
+                <p><strong>Участники:</strong> ${narrative.dialog.participants.join(' и ')}</p>
+                <div class="dialog">
+                    ${narrative.dialog.lines.map(line => `
+                        <div class="dialog-line">
+                            <strong>${line.speaker}:</strong> ${line.text}
                         </div>
                     `).join('')}
-                    <button onclick="checkNarrativeAnswers()" class="submit-btn">Проверить ответы</button>
                 </div>
-            ` : `
-                <!-- Если нарративного контента нет -->
-                <div class="section">
-                    <p>Для этого материала нарративный контент не был сгенерирован.</p>
-                    <p><strong>Тип контента:</strong> ${data.content_analysis?.primary_type || 'Не определен'}</p>
-                </div>
-            `}
             </div>
-        </div>
-    `;
-
-    container.innerHTML = html;
-    initCardSystem(m.flashcards);
+            
+            <!-- Интерактивные вопросы -->
+            <div class="section">
+                <h3>❓ Интерактивные вопросы</h3>
+                ${narrative.interactive_questions.map((q, index) => `
+                    <div class="question">
+                        <h4>Вопрос ${index + 1}: ${q.question}</h4>
+                        <div class="options">
+                            ${q.options.map((opt, optIndex) => `
+                                <label>
+                                    <input type="radio" name="narrative_q${index}" value="${optIndex}">
+                                    ${opt}
+                                </label>
+                            `).join('')}
+                        </div>
+                    </div>
+                `).join('')}
+                <button onclick="checkNarrativeAnswers()" class="submit-btn">Проверить ответы</button>
+            </div>
+        ` : `
+            <!-- Если нарративного контента нет -->
+            <div class="section">
+                <p>Для этого материала нарративный контент не был сгенерирован.</p>
+                <p><strong>Тип контента:</strong> ${window.contentAnalysis?.primary_type || 'Не определен'}</p>
+            </div>
+        `}
+    `);
 }
 
 // Вспомогательные функции для иконок
@@ -365,6 +490,8 @@ function showMatTab(tabName) {
 
     document.getElementById(tabName + 'Tab').classList.add('active');
     document.querySelector(`[onclick="showMatTab('${tabName}')"]`).classList.add('active');
+
+    if (tabName === 'export') loadMarkdown();
 }
 
 // Система карточек
@@ -422,11 +549,83 @@ function updateCardCounter() {
     }
 }
 
+// Интервальное повторение: оценки копятся и отправляются пачкой в /reviews
+const REVIEW_FLUSH_DELAY = 3000;
+let pendingReviews = [];
+let reviewFlushTimer = null;
+
+function getUserId() {
+    let userId = localStorage.getItem('learngameUserId');
+    if (!userId) {
+        userId = crypto.randomUUID();
+        localStorage.setItem('learngameUserId', userId);
+    }
+    return userId;
+}
+
 function rateCard(cardIndex, difficulty) {
     const difficulties = ['', 'Трудно', 'Нормально', 'Легко'];
+    pendingReviews.push({
+        // ID документа фиксируем при оценке: к отправке может прийти другой документ
+        documentId: currentDocument ? currentDocument.document_id : null,
+        card: allFlashcards[cardIndex],
+        grade: difficulty,
+        reviewed_at: Date.now() / 1000
+    });
+    clearTimeout(reviewFlushTimer);
+    reviewFlushTimer = setTimeout(flushReviews, REVIEW_FLUSH_DELAY);
     showNotification(`Карточка отмечена как "${difficulties[difficulty]}"`, 'success');
 }
 
+function takeReviewBatch() {
+    // ID документа известен после события "done"; до него оценки ждут
+    const entries = pendingReviews.filter(review => review.documentId !== null);
+    if (entries.length === 0) return null;
+    pendingReviews = pendingReviews.filter(review => review.documentId === null);
+    return {
+        entries,
+        body: {
+            user_id: getUserId(),
+            reviews: entries.map(review => ({
+                card_id: `${review.documentId}:${review.card.id}`,
+                grade: review.grade,
+                reviewed_at: review.reviewed_at
+            }))
+        }
+    };
+}
+
+async function flushReviews() {
+    const batch = takeReviewBatch();
+    if (!batch) {
+        if (pendingReviews.length) reviewFlushTimer = setTimeout(flushReviews, REVIEW_FLUSH_DELAY);
+        return;
+    }
+    try {
+        const response = await fetch('/reviews', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify(batch.body)
+        });
+        if (!response.ok) throw new Error(`Ошибка сервера: ${response.status}`);
+    } catch (error) {
+        // Не теряем оценки: возвращаем их в начало очереди и повторяем позже
+        console.error('Оценки не сохранены, повторим:', error);
+        pendingReviews = batch.entries.concat(pendingReviews);
+        clearTimeout(reviewFlushTimer);
+        reviewFlushTimer = setTimeout(flushReviews, REVIEW_FLUSH_DELAY);
+    }
+}
+
+// Уходя со страницы, отправляем оставшиеся оценки
+document.addEventListener('visibilitychange', () => {
+    if (document.visibilityState !== 'hidden') return;
+    const batch = takeReviewBatch();
+    if (batch) {
+        navigator.sendBeacon('/reviews', new Blob([JSON.stringify(batch.body)], { type: 'application/json' }));
+    }
+});
+
 // Тест
 function submitTest() {
     let correct = 0;
@@ -496,7 +695,7 @@ function checkNarrativeAnswers() {
 
     questions.forEach((q, index) => {
         const selected = q.querySelector('input:checked');
-        // Используем window.data, который создается в displayStructuredData
+        // Используем window.data, который создается в renderSpecializedContent
         const correctIndex = window.data?.specialized_content?.narrative?.interactive_questions?.[index]?.correct;
 
         if (selected && parseInt(selected.value) === correctIndex) {
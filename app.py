@@ -1,15 +1,47 @@
-import pdfplumber
+import asyncio
 import json
+import logging
 import os
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from fastapi import FastAPI, UploadFile, File
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+from fastapi import Body, FastAPI, Request, UploadFile, File
+from fastapi.concurrency import iterate_in_threadpool, run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse, StreamingResponse
 from groq import Groq
-from learning_engine import LearningEngine
+from chunking import ENTITY_TYPES, merge_entities, split_into_chunks
+from entity_index import EntityIndex
+from jobs import JobQueue, QueueFullError
+from learning_engine import LearningEngine, combined_entities, request_combined_materials
+from llm_client import PromptCache, RateLimitedClient
+from llm_json import ENTITIES_SCHEMA, parse_llm_json
+from metrics import Timings, propagate_context, render_prometheus, span, use_timings
+from pdf_extract import extract_text_from_pdf, shutdown_pools
+from responses import CompressionMiddleware, FastJSONResponse, dumps, etag_response
+from result_cache import ResultCache
+from spaced_repetition import GRADE_QUALITY, ReviewStore
+from static_assets import StaticAssets
+from uploads import (
+    UploadTooLargeError,
+    cleanup_materials,
+    discard_files,
+    extract_zip_pdfs,
+    hash_file,
+    sanitize_filename,
+    save_upload,
+)
+
+# Уровень логов: DEBUG показывает этапы движка, WARNING оставляет только проблемы
+logging.basicConfig(
+    level=os.environ.get("LEARNGAME_LOG_LEVEL", "INFO").upper(),
+    format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
+)
+logger = logging.getLogger("learngame")
 
-app = FastAPI()
+app = FastAPI(default_response_class=FastJSONResponse)
 
 # Разрешаем запросы от фронтенда
 app.add_middleware(
@@ -18,29 +50,120 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# gzip/brotli для всех ответов, включая потоки SSE
+app.add_middleware(CompressionMiddleware)
 
-# ПРАВИЛЬНЫЙ ПУТЬ К FRONTEND
+# ПРАВИЛЬНЫЙ ПУТЬ К FRONTEND: файлы читаются в память при старте (static_assets.load)
 BASE_DIR = Path(__file__).parent.parent
 FRONTEND_DIR = BASE_DIR / "frontend"
 
-print(f"📁 Ищем frontend по пути: {FRONTEND_DIR}")
-print(f"📁 Папка существует: {FRONTEND_DIR.exists()}")
+# LEARNGAME_STATIC_RELOAD=1 (run.py в режиме разработки) — подхватывать правки фронтенда
+static_assets = StaticAssets(
+    str(FRONTEND_DIR), reload=os.environ.get("LEARNGAME_STATIC_RELOAD", "0") == "1"
+)
+
+# Число процессов-воркеров (run.py --workers): бюджеты LLM и кэши SQLite общие на все
+WEB_WORKERS = max(1, int(os.environ.get("LEARNGAME_WEB_WORKERS", "1")))
+
+# Лимиты Groq действуют на ключ, поэтому бюджет делится между процессами поровну
+# (с округлением вниз, чтобы сумма не превышала лимит ключа)
+LLM_RPM = int(os.environ.get("LEARNGAME_LLM_RPM", "30"))
+LLM_TPM = int(os.environ.get("LEARNGAME_LLM_TPM", "12000"))
+if WEB_WORKERS > min(LLM_RPM, LLM_TPM):
+    raise RuntimeError(
+        f"Процессов ({WEB_WORKERS}) больше лимита ключа Groq (LEARNGAME_LLM_RPM={LLM_RPM}, "
+        f"LEARNGAME_LLM_TPM={LLM_TPM}): уменьшите --workers"
+    )
+
+# Инициализируем клиент Groq: один на процесс, с лимитами RPM/TPM и повторами
+# (адрес API можно подменить через GROQ_BASE_URL, например на fake_groq.serve_fake_groq).
+# Кэш промптов и мемо движка — в памяти процесса, между процессами не делятся
+client = RateLimitedClient(
+    Groq(api_key=os.environ.get("GROQ_API_KEY", ""), max_retries=0),
+    rpm=LLM_RPM // WEB_WORKERS,
+    tpm=LLM_TPM // WEB_WORKERS,
+    max_retries=int(os.environ.get("LEARNGAME_LLM_RETRIES", "3")),
+    timeout=float(os.environ.get("LEARNGAME_LLM_TIMEOUT", "30")),
+    # Кэш ответов по (модель, температура, промпт): одинаковые подзапросы разных документов
+    prompt_cache=PromptCache(
+        max_entries=int(os.environ.get("LEARNGAME_PROMPT_CACHE_SIZE", "2048")),
+        ttl=float(os.environ.get("LEARNGAME_PROMPT_CACHE_TTL_HOURS", "24")) * 3600,
+    ),
+    cache_max_temperature=float(os.environ.get("LEARNGAME_PROMPT_CACHE_MAX_TEMPERATURE", "0.7")),
+)
 
-app.mount("/static", StaticFiles(directory=str(FRONTEND_DIR)), name="static")
+# Map-reduce извлечение сущностей по всей книге вместо первых 8000 символов
+CHUNKED_EXTRACTION = os.environ.get("LEARNGAME_CHUNKED_EXTRACTION", "0") == "1"
+CHUNK_TOKENS = int(os.environ.get("LEARNGAME_CHUNK_TOKENS", "2000"))
+MAX_CHUNKS = int(os.environ.get("LEARNGAME_MAX_CHUNKS", "48"))
+EXTRACTION_CONCURRENCY = int(os.environ.get("LEARNGAME_EXTRACTION_CONCURRENCY", "4"))
+# Сколько текста читать из PDF в режиме чанков (ограничивает память воркера)
+CHUNKED_MAX_CHARS = int(os.environ.get("LEARNGAME_CHUNKED_MAX_CHARS", "1000000"))
+# Процессов для разбора больших PDF диапазонами страниц (1 = последовательно)
+PDF_WORKERS = int(os.environ.get("LEARNGAME_PDF_WORKERS", "1"))
+# Бэкенд извлечения: "auto" (pdfium, при плохом тексте — pdfplumber), "pdfium", "pdfplumber"
+PDF_BACKEND = os.environ.get("LEARNGAME_PDF_BACKEND", "auto")
+
+# Сколько запросов дистракторов теста выполнять параллельно
+DISTRACTOR_CONCURRENCY = int(os.environ.get("LEARNGAME_DISTRACTOR_CONCURRENCY", "5"))
+# Дистракторы: "llm" (модель, локальные при сбое) или "local" (без вызовов модели)
+DISTRACTOR_MODE = os.environ.get("LEARNGAME_DISTRACTOR_MODE", "llm")
+# Бюджет контекста промпта о сущности: фрагменты всего текста, где она упоминается
+CONTEXT_TOKENS = int(os.environ.get("LEARNGAME_CONTEXT_TOKENS", "300"))
+
+# Режим движка: "multi" — отдельный запрос на каждый артефакт, "single" — один
+# запрос на сущности, тип контента, дистракторы и нарратив (недостающее дозапрашивается)
+ENGINE_MODE = os.environ.get("LEARNGAME_ENGINE_MODE", "multi")
+
+# Версия промптов/модели: меняйте при изменении промптов, чтобы сбросить кэш
+PIPELINE_VERSION = (
+    "llama-3.3-70b-versatile:v2"
+    + (":chunked" if CHUNKED_EXTRACTION else "")
+    + (":single" if ENGINE_MODE == "single" else "")
+    + (":local-distractors" if DISTRACTOR_MODE == "local" else f":context{CONTEXT_TOKENS}")
+)
 
-# Инициализируем клиент Groq
-client = Groq(api_key="")
+# Кэш готовых материалов по хэшу PDF
+result_cache = ResultCache(
+    path=os.environ.get("LEARNGAME_CACHE_PATH", "cache/results.sqlite3"),
+    max_bytes=int(os.environ.get("LEARNGAME_CACHE_MAX_MB", "512")) * 1024 * 1024,
+)
 
+# Индекс сущностей всех обработанных документов (для /search и повторного использования)
+entity_index = EntityIndex(
+    path=os.environ.get("LEARNGAME_INDEX_PATH", "cache/entities.sqlite3")
+)
 
-def extract_text_from_pdf(pdf_path: str) -> str:
-    """Извлекает текст из PDF файла."""
-    text = ""
-    with pdfplumber.open(pdf_path) as pdf:
-        for page in pdf.pages:
-            page_text = page.extract_text()
-            if page_text:
-                text += page_text + "\n"
-    return text[:10000]
+# Интервальное повторение карточек (SM-2): состояние по пользователям и карточкам
+review_store = ReviewStore(
+    path=os.environ.get("LEARNGAME_REVIEWS_PATH", "cache/reviews.sqlite3")
+)
+REVIEW_BATCH_MAX = int(os.environ.get("LEARNGAME_REVIEW_BATCH_MAX", "500"))
+
+
+# Очередь фоновой обработки загрузок: число воркеров (= одновременных конвейеров)
+# задаётся независимо от числа HTTP-соединений
+JOB_WORKERS = int(os.environ.get("LEARNGAME_JOB_WORKERS", "2"))
+JOB_QUEUE_SIZE = int(os.environ.get("LEARNGAME_JOB_QUEUE_SIZE", "50"))
+JOB_TTL_HOURS = float(os.environ.get("LEARNGAME_JOB_TTL_HOURS", "24"))
+# Остановка процесса: сколько ждать текущие задачи; незавершённые после истечения
+# аренды (LEARNGAME_JOB_LEASE_SECONDS) подхватят другие процессы
+JOB_DRAIN_SECONDS = float(os.environ.get("LEARNGAME_JOB_DRAIN_SECONDS", "30"))
+JOB_LEASE_SECONDS = float(os.environ.get("LEARNGAME_JOB_LEASE_SECONDS", "60"))
+
+# Пакетная загрузка курса: сколько документов обрабатывать одновременно и сколько принимать
+BATCH_CONCURRENCY = int(os.environ.get("LEARNGAME_BATCH_CONCURRENCY", "4"))
+BATCH_MAX_FILES = int(os.environ.get("LEARNGAME_BATCH_MAX_FILES", "100"))
+# Общий объём документов пакета после распаковки архивов
+BATCH_MAX_BYTES = int(os.environ.get("LEARNGAME_BATCH_MAX_MB", "500")) * 1024 * 1024
+
+# Загрузки пишутся на диск потоково; лимит размера одного файла (и zip-архива)
+MATERIALS_DIR = os.environ.get("LEARNGAME_MATERIALS_DIR", "materials")
+MAX_UPLOAD_BYTES = int(os.environ.get("LEARNGAME_MAX_UPLOAD_MB", "50")) * 1024 * 1024
+# Хранение materials/: возраст файлов, общий объём и период очистки
+MATERIALS_TTL_HOURS = float(os.environ.get("LEARNGAME_MATERIALS_TTL_HOURS", "24"))
+MATERIALS_MAX_BYTES = int(os.environ.get("LEARNGAME_MATERIALS_MAX_MB", "2048")) * 1024 * 1024
+MATERIALS_CLEANUP_MINUTES = float(os.environ.get("LEARNGAME_MATERIALS_CLEANUP_MINUTES", "30"))
 
 
 def analyze_text_with_ai(text: str) -> dict:
@@ -92,94 +215,748 @@ def analyze_text_with_ai(text: str) -> dict:
 
         response = chat_completion.choices[0].message.content
 
-        # Ищем JSON в ответе
-        start = response.find("{")
-        end = response.rfind("}") + 1
-        json_str = response[start:end]
-
-        return json.loads(json_str)
+        # Разбираем JSON (с починкой обрезанного ответа)
+        with span("json_parse"):
+            result = parse_llm_json(response, ENTITIES_SCHEMA)
+        if not result:
+            return {"error": "Не удалось разобрать JSON из ответа модели"}
+        return result
 
     except Exception as e:
         return {"error": str(e)}
 
 
-@app.post("/upload")
-async def upload_file(file: UploadFile = File(...)):
-    """Эндпоинт для загрузки PDF."""
+def analyze_chunks_with_ai(chunks: List[str]) -> dict:
+    """
+    Map-reduce извлечение: каждый чанк анализируется отдельным запросом
+    (не больше EXTRACTION_CONCURRENCY одновременно), сущности сливаются по имени.
+    """
+    with ThreadPoolExecutor(max_workers=max(1, EXTRACTION_CONCURRENCY)) as pool:
+        parts = list(pool.map(propagate_context(analyze_text_with_ai), chunks))
+
+    succeeded = [part for part in parts if "error" not in part]
+    if not succeeded:
+        return {"error": parts[0]["error"] if parts else "Пустой текст"}
+    if len(succeeded) < len(parts):
+        logger.warning(
+            "Не удалось обработать %d из %d чанков", len(parts) - len(succeeded), len(parts)
+        )
+    return merge_entities(succeeded)
+
+
+# Порядок артефактов в потоке событий (для ответа из кэша)
+STREAM_STAGES = [
+    "study_guide",
+    "flashcards",
+    "test",
+    "markdown",
+    "content_analysis",
+    "specialized_content",
+    "stats",
+]
+
+# Артефакты, которые отдаются по /documents/{document_id}/{artifact} (путь JSON в результате)
+DOCUMENT_ARTIFACTS = {
+    "structured_data": "$.structured_data",
+    **{name: f"$.all_materials.{name}" for name in STREAM_STAGES},
+}
+# Не шлются в потоке /upload/stream: дублируют другие артефакты, забираются по запросу
+LAZY_ARTIFACTS = {"markdown"}
+
+
+def _compact_result(result: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Краткий ответ о документе: сводка и ссылки на артефакты вместо их содержимого
+    (сами артефакты хранятся в кэше результатов под document_id).
+    """
+    if result.get("status") != "success":
+        return result
+    document_id = result["document_id"]
+    materials = result.get("all_materials", {})
+    compact = {
+        "document_id": document_id,
+        "filename": result.get("filename"),
+        "status": "success",
+        "content_analysis": materials.get("content_analysis", {}),
+        "stats": materials.get("stats", {}),
+        "artifacts": {
+            name: f"/documents/{document_id}/{name}" for name in DOCUMENT_ARTIFACTS
+        },
+    }
+    for key in ("llm_calls", "timings"):
+        if key in result:
+            compact[key] = result[key]
+    return compact
+
+
+def run_pipeline(
+    file_path: str, filename: str, doc_hash: str, timings: Timings = None
+) -> Iterator[Tuple[str, Any]]:
+    """
+    Полный конвейер обработки PDF, уже сохранённого на диск (doc_hash — SHA-256 файла).
+    Отдаёт события (имя, данные) по мере готовности: "entities", этапы движка,
+    затем "done" с полным результатом или "error".
+    Если передан timings, в результат добавляется блок "timings".
+    """
+    logger.info("=== НАЧАЛО ОБРАБОТКИ ФАЙЛА %s ===", filename)
+
+    # Проверяем кэш: тот же файл уже обрабатывался
+    cache_key = ResultCache.make_key(doc_hash, PIPELINE_VERSION)
+    with use_timings(timings), span("cache_lookup"):
+        cached = result_cache.get(cache_key)
+    if cached is not None:
+        logger.info("⚡ Результат взят из кэша: %s", cache_key)
+        cached["filename"] = filename
+        cached["document_id"] = doc_hash
+        cached["llm_calls"] = 0
+        if not entity_index.has_document(doc_hash):
+            entity_index.add_document(doc_hash, filename, cached["structured_data"])
+        if timings is not None:
+            cached["timings"] = timings.as_dict()
+        yield "entities", cached["structured_data"]
+        for name in STREAM_STAGES:
+            yield name, cached["all_materials"][name]
+        yield "done", cached
+        return
+
+    # Извлекаем текст
+    logger.info("📄 Извлекаю текст из PDF...")
+    with use_timings(timings), span("pdf_extract"):
+        text = extract_text_from_pdf(
+            file_path,
+            max_chars=CHUNKED_MAX_CHARS if CHUNKED_EXTRACTION else 10000,
+            workers=PDF_WORKERS,
+            backend=PDF_BACKEND,
+        )
+
+    if not text or len(text) < 10:
+        yield "error", {"error": "Не удалось извлечь текст из PDF"}
+        return
+
+    # Анализируем через ИИ
+    logger.info("🤖 Анализирую текст через ИИ...")
+    with use_timings(timings), span("entity_extraction"):
+        combined = None
+        extraction_calls = 0
+        if ENGINE_MODE == "single":
+            combined = request_combined_materials(client, text)
+            extraction_calls = 1
+        structured_data = combined_entities(combined)
+        # Обычное извлечение: режим multi или единый запрос не вернул сущностей
+        if structured_data is None and CHUNKED_EXTRACTION:
+            chunks = split_into_chunks(text, token_budget=CHUNK_TOKENS, max_chunks=MAX_CHUNKS)
+            logger.info("🧩 Текст разбит на %d чанков", len(chunks))
+            structured_data = analyze_chunks_with_ai(chunks)
+            extraction_calls += len(chunks)
+        elif structured_data is None:
+            structured_data = analyze_text_with_ai(text)
+            extraction_calls += 1
+
+    if "error" in structured_data:
+        yield "error", {"error": f"Ошибка ИИ: {structured_data['error']}"}
+        return
+
+    # Пустые поля дополняем из прошлых документов, затем индексируем этот
+    entity_index.enrich(structured_data)
+    entity_index.add_document(doc_hash, filename, structured_data)
+
+    yield "entities", structured_data
+
+    # Создаём движок
+    engine = LearningEngine(
+        structured_data,
+        text,
+        client,
+        distractor_concurrency=DISTRACTOR_CONCURRENCY,
+        timings=timings,
+        combined=combined,
+        distractor_mode=DISTRACTOR_MODE,
+        context_tokens=CONTEXT_TOKENS,
+        # Словарь ролей из документов той же темы для локальных дистракторов
+        role_vocabulary=entity_index.role_vocabulary(
+            entity["name"] for entity in structured_data.get("characters", [])
+        ),
+    )
+
+    # Создаём обучающие материалы (анализ структуры выполняется внутри)
+    logger.info("🎮 Создаю обучающие материалы...")
+    all_materials = {}
+    for name, artifact in engine.iter_materials():
+        all_materials[name] = artifact
+        yield name, artifact
+    content_analysis = all_materials.get("content_analysis", {})
+
+    logger.debug("📊 Результат анализа типа: %s", content_analysis)
+
+    result = {
+        "document_id": doc_hash,
+        "filename": filename,
+        "structured_data": structured_data,
+        "content_analysis": content_analysis,
+        "all_materials": all_materials,
+        # Сколько раз за загрузку реально вызывалась модель (извлечение + движок)
+        "llm_calls": extraction_calls + engine.llm_calls,
+        "status": "success",
+    }
+    result_cache.set(cache_key, result)
+    if timings is not None:
+        result["timings"] = timings.as_dict()
+    yield "done", result
+
+
+def process_document(
+    file_path: str, filename: str, doc_hash: str = None, timings: Timings = None
+) -> Dict[str, Any]:
+    """Прогоняет конвейер до конца и возвращает итоговый результат или ошибку."""
+    if doc_hash is None:
+        doc_hash = hash_file(file_path)
+    for event, data in run_pipeline(file_path, filename, doc_hash, timings):
+        if event in ("done", "error"):
+            return data
+    return {"error": "Конвейер завершился без результата", "status": "error"}
+
+
+def _run_job(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Обработчик задачи очереди: файл уже сохранён на диск при загрузке."""
+    timings = Timings() if payload.get("timings") else None
+    return _compact_result(
+        process_document(payload["path"], payload["filename"], payload.get("doc_hash"), timings)
+    )
+
+
+job_queue = JobQueue(
+    _run_job,
+    path=os.environ.get("LEARNGAME_JOBS_PATH", "cache/jobs.sqlite3"),
+    workers=JOB_WORKERS,
+    max_pending=JOB_QUEUE_SIZE,
+    lease=JOB_LEASE_SECONDS,
+)
+
+
+def cleanup_materials_dir() -> int:
+    """Очищает materials/ по политике хранения, не трогая файлы задач в очереди."""
+    keep = [payload.get("path", "") for payload in job_queue.active_payloads()]
+    removed = cleanup_materials(
+        MATERIALS_DIR,
+        max_age=MATERIALS_TTL_HOURS * 3600,
+        max_bytes=MATERIALS_MAX_BYTES,
+        keep=keep,
+    )
+    if removed:
+        logger.info("🧹 Удалено файлов из %s: %d", MATERIALS_DIR, removed)
+    return removed
+
+
+_materials_janitor_stop = threading.Event()
+
+
+def _materials_janitor() -> None:
+    while not _materials_janitor_stop.wait(MATERIALS_CLEANUP_MINUTES * 60):
+        try:
+            cleanup_materials_dir()
+        except Exception:
+            logger.exception("Ошибка очистки %s", MATERIALS_DIR)
+
+
+@app.on_event("startup")
+def start_job_workers():
+    static_assets.load()
+    job_queue.purge(older_than=JOB_TTL_HOURS * 3600)
+    job_queue.start()
+    cleanup_materials_dir()
+    _materials_janitor_stop.clear()
+    threading.Thread(target=_materials_janitor, name="materials-janitor", daemon=True).start()
+
+
+@app.on_event("shutdown")
+def stop_job_workers():
+    _materials_janitor_stop.set()
+    # Новые задачи не берём, текущие доделываем (остальные подхватят другие процессы)
+    unfinished = job_queue.stop(timeout=JOB_DRAIN_SECONDS)
+    if unfinished:
+        logger.warning("Остановка до завершения задач: %d вернутся в очередь", unfinished)
+    shutdown_pools()
+
+
+def _upload_too_large(e: Exception) -> JSONResponse:
+    return JSONResponse(status_code=413, content={"error": str(e), "status": "error"})
+
+
+def _bad_upload(e: Exception) -> JSONResponse:
+    return JSONResponse(
+        status_code=400,
+        content={"error": f"Не удалось прочитать файл: {e}", "status": "error"},
+    )
+
+
+@app.post("/upload", status_code=202)
+async def upload_file(file: UploadFile = File(...), timings: bool = False):
+    """
+    Эндпоинт для загрузки PDF: сохраняет файл и ставит его в очередь обработки.
+    Сразу возвращает ID задачи; статус и результат — в /jobs/{job_id}.
+    ?timings=true добавляет в результат блок таймингов.
+    """
 
     try:
-        # Сохраняем файл
-        print(f"=== НАЧАЛО ОБРАБОТКИ ФАЙЛА {file.filename} ===")
-        file_path = f"materials/{file.filename}"
-        os.makedirs("materials", exist_ok=True)
-
-        with open(file_path, "wb") as f:
-            content = await file.read()
-            f.write(content)
-
-        # Извлекаем текст
-        print("📄 Извлекаю текст из PDF...")
-        text = extract_text_from_pdf(file_path)
-
-        if not text or len(text) < 10:
-            return {"error": "Не удалось извлечь текст из PDF"}
-
-        # Анализируем через ИИ
-        print("🤖 Анализирую текст через ИИ...")
-        structured_data = analyze_text_with_ai(text)
-
-        if "error" in structured_data:
-            return {"error": f"Ошибка ИИ: {structured_data['error']}"}
-
-        # Создаём движок и анализируем структуру
-        print("🔍 Анализирую структуру контента...")
-        engine = LearningEngine(structured_data, text, client)
-        content_analysis = engine.analyze_content_structure()
-
-        print(f"📊 Результат анализа типа: {content_analysis}")
-
-        # Создаём обучающие материалы
-        print("🎮 Создаю обучающие материалы...")
-        all_materials = engine.create_all_materials()
-
-        return {
-            "filename": file.filename,
-            "text_preview": text[:500] + "...",
-            "structured_data": structured_data,
-            "content_analysis": all_materials.get("content_analysis", {}),
-            "all_materials": all_materials,
+        # Потоково на диск под именем по хэшу содержимого
+        file_path, doc_hash, created = await save_upload(file, MATERIALS_DIR, MAX_UPLOAD_BYTES)
+
+        job_id = await run_in_threadpool(
+            job_queue.submit,
+            {
+                "path": file_path,
+                "filename": sanitize_filename(file.filename),
+                "doc_hash": doc_hash,
+                "timings": timings,
+            },
+        )
+        return {"job_id": job_id, "status": "queued", "status_url": f"/jobs/{job_id}"}
+
+    except UploadTooLargeError as e:
+        return _upload_too_large(e)
+    except QueueFullError as e:
+        # Отклонённая загрузка не занимает диск до очистки materials/
+        # (файл, который ждёт в очереди под тем же хэшем, останется)
+        if created:
+            await run_in_threadpool(_discard_batch, [file_path])
+        return JSONResponse(
+            status_code=429,
+            content={"error": f"Сервер перегружен: {e}", "status": "error"},
+            headers={"Retry-After": "30"},
+        )
+    except Exception as e:
+        return {"error": f"Ошибка сервера: {str(e)}", "status": "error"}
+
+
+@app.get("/jobs")
+async def jobs_stats():
+    """Состояние очереди задач."""
+    return await run_in_threadpool(job_queue.stats)
+
+
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    """Статус задачи; когда она готова, в поле result — ответ конвейера."""
+    job = await run_in_threadpool(job_queue.get, job_id)
+    if job is None:
+        return JSONResponse(
+            status_code=404, content={"error": "Задача не найдена", "status": "error"}
+        )
+    return job
+
+
+def _document_not_found(what: str = "Документ") -> JSONResponse:
+    return JSONResponse(
+        status_code=404, content={"error": f"{what} не найден", "status": "error"}
+    )
+
+
+@app.get("/documents/{document_id}")
+async def document_summary(document_id: str, request: Request):
+    """Сводка обработанного документа и ссылки на его артефакты."""
+    key = ResultCache.make_key(document_id, PIPELINE_VERSION)
+    fields = await run_in_threadpool(
+        result_cache.get_fields,
+        key,
+        ["$.filename", "$.all_materials.content_analysis", "$.all_materials.stats"],
+    )
+    if fields is None:
+        return _document_not_found()
+    filename, content_analysis, stats = (json.loads(field) for field in fields)
+    summary = _compact_result(
+        {
+            "document_id": document_id,
+            "filename": filename,
             "status": "success",
+            "all_materials": {"content_analysis": content_analysis, "stats": stats},
         }
+    )
+    return etag_response(request, dumps(summary), "application/json")
 
+
+@app.get("/documents/{document_id}/{artifact}")
+async def document_artifact(document_id: str, artifact: str, request: Request):
+    """
+    Один артефакт документа (flashcards, test, markdown, ...) по запросу.
+    ETag по содержимому: повторный запрос с If-None-Match получает 304 без тела.
+    """
+    path = DOCUMENT_ARTIFACTS.get(artifact)
+    if path is None:
+        return _document_not_found("Артефакт")
+    key = ResultCache.make_key(document_id, PIPELINE_VERSION)
+    fields = await run_in_threadpool(result_cache.get_fields, key, [path])
+    if fields is None:
+        return _document_not_found()
+    if fields[0] == "null":
+        return _document_not_found("Артефакт")
+    if artifact == "markdown":
+        # Markdown — готовый файл для скачивания, а не JSON-строка
+        body = json.loads(fields[0]).encode("utf-8")
+        return etag_response(request, body, "text/markdown; charset=utf-8")
+    return etag_response(request, fields[0].encode("utf-8"), "application/json")
+
+
+def _sse(event: str, data: Any) -> str:
+    """Форматирует одно событие Server-Sent Events."""
+    return f"event: {event}\ndata: {dumps(data).decode('utf-8')}\n\n"
+
+
+@app.post("/upload/stream")
+async def upload_file_stream(file: UploadFile = File(...), timings: bool = False):
+    """
+    Потоковый вариант /upload: каждый артефакт отправляется SSE-событием сразу,
+    как только готов его этап (кроме LAZY_ARTIFACTS — они по ссылке).
+    Последнее событие — "done" (краткая сводка со ссылками на артефакты) или "error".
+    """
+    try:
+        file_path, doc_hash, _ = await save_upload(file, MATERIALS_DIR, MAX_UPLOAD_BYTES)
+    except UploadTooLargeError as e:
+        return _upload_too_large(e)
+    except OSError as e:
+        return _bad_upload(e)
+    filename = sanitize_filename(file.filename)
+
+    async def events():
+        try:
+            async for event, data in iterate_in_threadpool(
+                run_pipeline(
+                    file_path, filename, doc_hash, Timings() if timings else None
+                )
+            ):
+                if event in LAZY_ARTIFACTS:
+                    continue
+                if event == "done":
+                    # Артефакты уже отправлены — повторно шлём только сводку
+                    data = _compact_result(data)
+                yield _sse(event, data)
+        except Exception as e:
+            yield _sse("error", {"error": f"Ошибка сервера: {str(e)}", "status": "error"})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _expand_batch(
+    uploads: List[Tuple[str, str, str, bool]]
+) -> List[Tuple[str, str, str]]:
+    """
+    Раскрывает zip-архивы: в пакет попадают все PDF из них, остальное — как есть.
+    Элементы — (имя, путь, хэш, создан ли файл) уже сохранённых файлов; созданные
+    этим запросом архивы после распаковки удаляются.
+    Бросает UploadTooLargeError, если документов больше BATCH_MAX_FILES или вместе
+    они больше BATCH_MAX_BYTES; созданные к этому моменту файлы удаляются.
+    """
+    documents = []
+    created = []
+    total = 0
+    try:
+        for filename, path, doc_hash, new in uploads:
+            if not zipfile.is_zipfile(path):
+                documents.append((filename, path, doc_hash))
+                if new:
+                    created.append(path)
+                total += os.path.getsize(path)
+            else:
+                try:
+                    extracted = extract_zip_pdfs(
+                        path,
+                        MATERIALS_DIR,
+                        MAX_UPLOAD_BYTES,
+                        max_files=max(0, BATCH_MAX_FILES - len(documents)),
+                        max_total_bytes=max(0, BATCH_MAX_BYTES - total),
+                    )
+                finally:
+                    # Тот же архив мог прийти в другом запросе — удаляем только свой
+                    if new:
+                        os.remove(path)
+                for name, item_path, item_hash, item_new in extracted:
+                    documents.append((name, item_path, item_hash))
+                    if item_new:
+                        created.append(item_path)
+                    total += os.path.getsize(item_path)
+            if len(documents) > BATCH_MAX_FILES:
+                raise UploadTooLargeError(
+                    f"Слишком много файлов: больше {BATCH_MAX_FILES} в пакете"
+                )
+            if total > BATCH_MAX_BYTES:
+                raise UploadTooLargeError(
+                    f"Пакет больше {BATCH_MAX_BYTES // (1024 * 1024)} МБ"
+                )
+    except BaseException:
+        _discard_batch(created)
+        raise
+    return documents
+
+
+def _discard_batch(paths: Iterable[str]) -> None:
+    """
+    Удаляет созданные отклонённым пакетом файлы, кроме ждущих обработки в очереди
+    (то же содержимое могло прийти в /upload после сохранения пакета).
+    """
+    keep = [payload.get("path", "") for payload in job_queue.active_payloads()]
+    discard_files(paths, keep)
+
+
+def _process_batch_file(
+    filename: str, file_path: str, doc_hash: str, timings: bool
+) -> Dict[str, Any]:
+    """Обрабатывает один документ пакета; ошибка не прерывает остальные."""
+    try:
+        result = process_document(
+            file_path, filename, doc_hash, Timings() if timings else None
+        )
     except Exception as e:
-        return {"error": f"Ошибка сервера: {str(e)}", "status": "error"}
+        logger.exception("Не удалось обработать %s", filename)
+        result = {"error": f"Ошибка сервера: {str(e)}", "status": "error"}
+    result.setdefault("filename", filename)
+    return result
 
 
-@app.get("/")
-@app.get("/")
-async def main():
-    """Главная страница с фронтендом."""
-    from pathlib import Path
+def _course_study_guide(results: List[Dict[str, Any]]) -> Dict:
+    """Общий конспект курса по сущностям всех документов (без вызовов модели)."""
+    merged = merge_entities([result["structured_data"] for result in results])
+    guide = LearningEngine(merged)._create_study_guide()
+    guide["title"] = "Конспект курса"
+    guide["documents"] = [result["filename"] for result in results]
+    return guide
 
-    # Правильный путь к index.html
-    BASE_DIR = Path(__file__).parent.parent
-    index_path = BASE_DIR / "frontend" / "index.html"
 
-    print(f"📁 Ищу index.html по пути: {index_path}")
-    print(f"📁 Файл существует: {index_path.exists()}")
+@app.post("/upload/batch")
+async def upload_batch(files: List[UploadFile] = File(...), timings: bool = False):
+    """
+    Пакетная загрузка курса: много PDF и/или zip-архивов за один запрос.
+    Одинаковые файлы обрабатываются один раз, документы — параллельно
+    (до BATCH_CONCURRENCY, через общий клиент LLM). SSE-события: "batch" (состав),
+    "file" по мере готовности каждого документа, "course" (общий конспект), "done".
+    """
+    if len(files) > BATCH_MAX_FILES:
+        return _upload_too_large(
+            UploadTooLargeError(
+                f"Слишком много файлов: {len(files)} (максимум {BATCH_MAX_FILES})"
+            )
+        )
+    uploads = []
+    try:
+        for file in files:
+            path, doc_hash, new = await save_upload(file, MATERIALS_DIR, MAX_UPLOAD_BYTES)
+            uploads.append((sanitize_filename(file.filename), path, doc_hash, new))
+        documents = await run_in_threadpool(_expand_batch, uploads)
+    except (UploadTooLargeError, zipfile.BadZipFile, OSError) as e:
+        # Отклонённый пакет не оставляет в materials/ созданных им файлов
+        created = [path for _, path, _, new in uploads if new]
+        await run_in_threadpool(_discard_batch, created)
+        if isinstance(e, UploadTooLargeError):
+            return _upload_too_large(e)
+        return _bad_upload(e)
+    if not documents:
+        return JSONResponse(
+            status_code=400, content={"error": "В пакете нет файлов", "status": "error"}
+        )
+
+    async def events():
+        unique: Dict[str, str] = {}
+        duplicates = []
+        queue = []
+        for filename, path, doc_hash in documents:
+            if doc_hash in unique:
+                duplicates.append({"filename": filename, "duplicate_of": unique[doc_hash]})
+                continue
+            unique[doc_hash] = filename
+            queue.append((filename, path, doc_hash))
+
+        yield _sse(
+            "batch",
+            {"files": len(documents), "unique": len(queue), "duplicates": duplicates},
+        )
+
+        loop = asyncio.get_running_loop()
+        pool = ThreadPoolExecutor(max_workers=max(1, BATCH_CONCURRENCY))
+        succeeded = []
+        failed = 0
+        try:
+            futures = [
+                loop.run_in_executor(pool, _process_batch_file, *item, timings)
+                for item in queue
+            ]
+            for future in asyncio.as_completed(futures):
+                result = await future
+                if result.get("status") == "success":
+                    succeeded.append(result)
+                else:
+                    failed += 1
+                yield _sse("file", _compact_result(result))
+        finally:
+            # Клиент отключился — не запускаем оставшиеся документы
+            pool.shutdown(wait=False, cancel_futures=True)
+
+        if succeeded:
+            guide = await run_in_threadpool(_course_study_guide, succeeded)
+            yield _sse("course", guide)
+        yield _sse(
+            "done",
+            {
+                "status": "success" if succeeded else "error",
+                "processed": len(succeeded),
+                "failed": failed,
+                "duplicates": len(duplicates),
+                "llm_calls": sum(result.get("llm_calls", 0) for result in succeeded),
+            },
+        )
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Метрики в формате Prometheus: гистограммы шагов конвейера и текущие показатели."""
+    gauges = []
+    cache = await run_in_threadpool(result_cache.stats)
+    jobs = await run_in_threadpool(job_queue.stats)
+    for key, value in cache.items():
+        gauges.append(("learngame_result_cache", "Кэш результатов /upload", {"stat": key}, value))
+    for key, value in jobs.items():
+        gauges.append(("learngame_jobs", "Очередь задач по статусам", {"stat": key}, value))
+    llm = client.metrics()
+    for key, value in llm.pop("prompt_cache", {}).items():
+        gauges.append(("learngame_prompt_cache", "Кэш промптов LLM", {"stat": key}, value))
+    for key, value in llm.items():
+        gauges.append(("learngame_llm_client", "Клиент LLM", {"stat": key}, value))
+    return PlainTextResponse(
+        render_prometheus(gauges), media_type="text/plain; version=0.0.4"
+    )
+
+
+@app.get("/llm/metrics")
+async def llm_metrics():
+    """Метрики клиента LLM: вызовы, повторы, 429, очередь ожидания бюджета, задержки."""
+    return client.metrics()
+
+
+@app.get("/search")
+async def search_entities(q: str = "", kind: str = None, limit: int = 20):
+    """
+    Поиск сущностей по всем обработанным документам (имя, роль, описание).
+    kind — characters/locations/events/objects; у каждой сущности — список документов-источников.
+    """
+    if not q.strip():
+        return JSONResponse(
+            status_code=400, content={"error": "Пустой запрос", "status": "error"}
+        )
+    if kind is not None and kind not in ENTITY_TYPES:
+        return JSONResponse(
+            status_code=400,
+            content={"error": f"Неизвестный тип сущности: {kind}", "status": "error"},
+        )
+    results = await run_in_threadpool(
+        entity_index.search, q, kind, max(1, min(limit, 100))
+    )
+    return {"query": q, "results": results}
+
 
-    if not index_path.exists():
+@app.get("/search/stats")
+async def search_stats():
+    """Сколько документов и сущностей в индексе."""
+    return await run_in_threadpool(entity_index.stats)
+
+
+def _bad_request(message: str) -> JSONResponse:
+    return JSONResponse(status_code=400, content={"error": message, "status": "error"})
+
+
+@app.post("/reviews")
+async def submit_reviews(payload: Dict[str, Any] = Body(...)):
+    """
+    Пачка оценок карточек одного пользователя: {"user_id": "...", "reviews": [...]},
+    оценка — {"card_id": "<document_id>:<id>", "grade": 0-3, "reviewed_at": unix-время}
+    (0 — забыл, 1 — трудно, 2 — нормально, 3 — легко; reviewed_at необязателен).
+    Оценки не новее последнего повторения карточки (повторная отправка) не применяются.
+    Возвращает текущее расписание оценённых карточек.
+    """
+    user_id = str(payload.get("user_id") or "").strip()
+    reviews = payload.get("reviews")
+    if not user_id or not isinstance(reviews, list) or not reviews:
+        return _bad_request("Нужны user_id и непустой список reviews")
+    if len(reviews) > REVIEW_BATCH_MAX:
+        return JSONResponse(
+            status_code=413,
+            content={
+                "error": f"Слишком много оценок: {len(reviews)} (максимум {REVIEW_BATCH_MAX})",
+                "status": "error",
+            },
+        )
+
+    parsed = []
+    for review in reviews:
+        try:
+            card_id = str(review["card_id"])
+            grade = int(review["grade"])
+            reviewed_at = review.get("reviewed_at")
+            reviewed_at = float(reviewed_at) if reviewed_at is not None else None
+        except (KeyError, TypeError, ValueError, AttributeError):
+            return _bad_request("Оценка должна содержать card_id и grade")
+        if not card_id or grade not in GRADE_QUALITY:
+            return _bad_request(f"Неверная оценка карточки {card_id!r}: {grade}")
+        parsed.append((card_id, grade, reviewed_at))
+
+    cards = await run_in_threadpool(review_store.review_many, user_id, parsed)
+    return {"status": "success", "cards": cards}
+
+
+@app.get("/reviews/due")
+async def due_reviews(user_id: str, limit: int = 20):
+    """Карточки, которые пользователю пора повторить (самые просроченные первыми)."""
+    limit = max(1, min(limit, 200))
+    cards = await run_in_threadpool(review_store.due, user_id, limit)
+    stats = await run_in_threadpool(review_store.stats, user_id)
+    return {"user_id": user_id, "cards": cards, "stats": stats}
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """Статистика кэша результатов."""
+    return await run_in_threadpool(result_cache.stats)
+
+
+@app.delete("/cache")
+async def invalidate_cache():
+    """Полностью очищает кэш результатов."""
+    deleted = await run_in_threadpool(result_cache.invalidate)
+    return {"deleted": deleted, "status": "success"}
+
+
+@app.delete("/cache/{doc_hash}")
+async def invalidate_document(doc_hash: str):
+    """Удаляет из кэша результаты для одного документа (SHA-256 файла)."""
+    deleted = await run_in_threadpool(result_cache.invalidate, doc_hash)
+    return {"deleted": deleted, "status": "success"}
+
+
+@app.api_route("/", methods=["GET", "HEAD"])
+async def main(request: Request):
+    """Главная страница с фронтендом (из памяти, ссылки на статику — с хэшем содержимого)."""
+    response = static_assets.response(request, "index.html")
+    if response is None:
         return HTMLResponse(
             "<h1>Ошибка</h1><p>Файл index.html не найден.</p>"
-            f"<p>Путь: {index_path}</p>"
+            f"<p>Путь: {FRONTEND_DIR / 'index.html'}</p>"
         )
+    return response
 
-    try:
-        with open(index_path, "r", encoding="utf-8") as f:
-            html_content = f.read()
-        return HTMLResponse(html_content)
-    except Exception as e:
-        return HTMLResponse(f"<h1>Ошибка чтения файла</h1><pre>{e}</pre>")
+
+@app.api_route("/static/{name:path}", methods=["GET", "HEAD"])
+async def static_file(name: str, request: Request):
+    """Файлы фронтенда; адреса с хэшем (app.<хэш>.js) кэшируются браузером навсегда."""
+    response = static_assets.response(request, name)
+    if response is None:
+        return JSONResponse(status_code=404, content={"error": "Файл не найден", "status": "error"})
+    return response
 
 
 if __name__ == "__main__":
@@ -0,0 +1,830 @@
+"""
+LearnGame AI - Бенчмарки и нагрузочные тесты
+Все сценарии работают локально с фейковым Groq (fake_groq.py), API-ключ не нужен.
+
+Запуск:
+    python bench.py load --uploads 20 --latency 0.5
+    python bench.py pdf --pages 400
+    python bench.py pdf-backends --files textbooks/*.pdf
+    python bench.py llm --requests 60 --rpm 30 --error-rate 0.2
+    python bench.py engine --docs 10 --latency 0.2
+    python bench.py search --docs 2000
+    python bench.py distractors --questions 500
+    python bench.py context --chars 300000 --entities 40
+    python bench.py reviews --users 10000 --cards 100
+    python bench.py suite --docs 20 --concurrency 4 --output bench.json
+    python bench.py suite --baseline bench.json   # ненулевой код при регрессии
+"""
+
+import argparse
+import copy
+import hashlib
+import json
+import os
+import random
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+
+def make_pdf(pages: List[str]) -> bytes:
+    """Собирает минимальный PDF (Helvetica, по странице на строку списка)."""
+    objects = [b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    pages_id = 1 + 2 * len(pages) + 1
+    page_ids = []
+
+    for text in pages:
+        lines = [
+            line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+            for line in text.split("\n")
+        ]
+        stream = (
+            "BT /F1 11 Tf 50 760 Td 13 TL "
+            + " ".join(f"({line}) '" for line in lines)
+            + " ET"
+        ).encode("latin-1", "replace")
+        objects.append(
+            b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream)
+        )
+        objects.append(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 612 792] "
+            b"/Contents %d 0 R /Resources << /Font << /F1 1 0 R >> >> >>"
+            % (pages_id, len(objects))
+        )
+        page_ids.append(len(objects))
+
+    kids = b" ".join(b"%d 0 R" % i for i in page_ids)
+    objects.append(b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(page_ids)))
+    objects.append(b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, obj in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (i, obj)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+        len(objects) + 1,
+        len(objects),
+        xref,
+    )
+    return bytes(out)
+
+
+def sample_pages(seed: int, count: int = 3) -> List[str]:
+    """Текст страниц учебника; seed делает документы разными (мимо кэша)."""
+    return [
+        f"Document {seed}, page {page + 1}.\n"
+        "Heracles is the son of Zeus. Hera, the wife of Zeus, persecuted Heracles.\n"
+        "Zeus is the supreme god of Olympus. Heracles performed twelve labours,\n"
+        "including the killing of the Nemean lion."
+        for page in range(count)
+    ]
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def _start_server(app_module):
+    """Поднимает uvicorn в фоновом потоке на свободном порту."""
+    import uvicorn
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    server = uvicorn.Server(
+        uvicorn.Config(app_module.app, host="127.0.0.1", port=port, log_level="warning")
+    )
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, thread, f"http://127.0.0.1:{port}"
+
+
+def run_load_test(uploads: int, latency: float) -> None:
+    """Параллельные загрузки в один воркер: не должны выполняться по очереди."""
+    import requests
+
+    workdir = tempfile.mkdtemp(prefix="learngame-bench-")
+    os.chdir(workdir)
+    os.environ["LEARNGAME_CACHE_PATH"] = os.path.join(workdir, "results.sqlite3")
+    os.environ["LEARNGAME_JOBS_PATH"] = os.path.join(workdir, "jobs.sqlite3")
+    os.environ["LEARNGAME_JOB_WORKERS"] = str(uploads)
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import app as app_module
+    from fake_groq import FakeGroq
+
+    app_module.client = FakeGroq(latency=latency)
+    server, thread, base_url = _start_server(app_module)
+
+    def upload(seed: int) -> float:
+        pdf = make_pdf(sample_pages(seed))
+        start = time.perf_counter()
+        response = requests.post(
+            f"{base_url}/upload",
+            files={"file": (f"doc{seed}.pdf", pdf, "application/pdf")},
+        )
+        response.raise_for_status()
+        status_url = base_url + response.json()["status_url"]
+        while True:
+            job = requests.get(status_url).json()
+            if job["status"] in ("done", "failed"):
+                break
+            time.sleep(0.02)
+        assert job["status"] == "done", job
+        return time.perf_counter() - start
+
+    try:
+        single = upload(0)
+
+        # Пока идут загрузки, измеряем задержку главной страницы
+        index_latencies = []
+        done = threading.Event()
+
+        def poll_index():
+            while not done.is_set():
+                start = time.perf_counter()
+                requests.get(f"{base_url}/")
+                index_latencies.append(time.perf_counter() - start)
+                time.sleep(0.05)
+
+        poller = threading.Thread(target=poll_index)
+        poller.start()
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=uploads) as pool:
+            latencies = list(pool.map(upload, range(1, uploads + 1)))
+        wall = time.perf_counter() - start
+        done.set()
+        poller.join()
+    finally:
+        server.should_exit = True
+        thread.join()
+
+    serial = single * uploads
+    print(f"Одна загрузка:              {single:.2f} с")
+    print(f"{uploads} загрузок параллельно: {wall:.2f} с (последовательно было бы ~{serial:.2f} с)")
+    print(f"Ускорение:                  {serial / wall:.1f}x")
+    print(f"Загрузка p50/p95:           {statistics.median(latencies):.2f} / {_percentile(latencies, 95):.2f} с")
+    if index_latencies:
+        print(
+            f"GET / во время загрузок:    p50 {statistics.median(index_latencies) * 1000:.1f} мс, "
+            f"max {max(index_latencies) * 1000:.1f} мс"
+        )
+
+
+def _legacy_extract_text(pdf_path: str) -> str:
+    """Исходная реализация: все страницы подряд и конкатенация через +=."""
+    import pdfplumber
+
+    text = ""
+    with pdfplumber.open(pdf_path) as pdf:
+        for page in pdf.pages:
+            page_text = page.extract_text()
+            if page_text:
+                text += page_text + "\n"
+    return text[:10000]
+
+
+def run_pdf_benchmark(pages: int, workers: int, repeat: int) -> None:
+    """Сравнивает исходное извлечение текста с потоковым и параллельным."""
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from pdf_extract import extract_text_from_pdf
+
+    fixture = os.path.join(tempfile.mkdtemp(prefix="learngame-bench-"), "book.pdf")
+    with open(fixture, "wb") as f:
+        f.write(make_pdf(sample_pages(0, count=pages)))
+    print(f"Фикстура: {pages} страниц, {os.path.getsize(fixture) // 1024} КБ")
+
+    def measure(label, fn):
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            text = fn()
+            times.append(time.perf_counter() - start)
+        print(f"{label:<44} {min(times) * 1000:9.1f} мс  ({len(text)} символов)")
+
+    measure("исходная (все страницы, +=)", lambda: _legacy_extract_text(fixture))
+    measure("потоковая, лимит 10 000 символов", lambda: extract_text_from_pdf(fixture))
+    measure(
+        "потоковая, весь документ",
+        lambda: extract_text_from_pdf(fixture, max_chars=10**9),
+    )
+    measure(
+        f"пул из {workers} процессов, весь документ",
+        lambda: extract_text_from_pdf(fixture, max_chars=10**9, workers=workers),
+    )
+
+
+def run_pdf_backend_benchmark(files: List[str], pages: int, repeat: int) -> None:
+    """
+    Страниц в секунду для каждого бэкенда извлечения на PDF из files
+    (по умолчанию — синтетическая книга из pages страниц) и выбор режима "auto".
+    """
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from pdf_extract import BACKENDS, choose_backend, count_pages, iter_pdf_pages
+
+    if not files:
+        fixture = os.path.join(tempfile.mkdtemp(prefix="learngame-bench-"), "book.pdf")
+        with open(fixture, "wb") as f:
+            f.write(make_pdf(sample_pages(0, count=pages)))
+        files = [fixture]
+
+    columns = " ".join(f"{name + ', стр/с':>18}" for name in BACKENDS)
+    print(f"{'файл':<32} {'страниц':>7} {columns}  auto")
+    for path in files:
+        total = count_pages(path)
+        speeds = []
+        for name in BACKENDS:
+            times = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                chars = sum(len(text) for text in iter_pdf_pages(path, backend=name))
+                times.append(time.perf_counter() - start)
+            speeds.append(f"{total / min(times):>10.0f} ({chars // 1000}K)")
+        print(
+            f"{os.path.basename(path)[:32]:<32} {total:>7} "
+            + " ".join(f"{speed:>18}" for speed in speeds)
+            + f"  {choose_backend(path)}"
+        )
+
+
+def run_llm_client_benchmark(
+    requests_count: int, concurrency: int, rpm: int, tpm: int, latency: float, error_rate: float
+) -> None:
+    """Гоняет RateLimitedClient против локального фейкового сервера Groq."""
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from groq import Groq
+    from fake_groq import serve_fake_groq
+    from llm_client import RateLimitedClient
+
+    server = serve_fake_groq(latency=latency, error_rate=error_rate)
+    client = RateLimitedClient(
+        Groq(api_key="fake", base_url=f"http://127.0.0.1:{server.server_port}", max_retries=0),
+        rpm=rpm,
+        tpm=tpm,
+        backoff_base=0.05,
+    )
+
+    def call(i: int) -> bool:
+        try:
+            client.chat.completions.create(
+                messages=[{"role": "user", "content": f'Запрос {i}: верни "distractors"'}],
+                model="llama-3.3-70b-versatile",
+                temperature=0.7,
+                max_tokens=200,
+            )
+            return True
+        except Exception:
+            return False
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        ok = sum(pool.map(call, range(requests_count)))
+    wall = time.perf_counter() - start
+    server.shutdown()
+
+    print(f"Успешно: {ok}/{requests_count} за {wall:.2f} с")
+    print(f"Сервер: {server.stats['requests']} запросов, {server.stats['errors']} ответов 429")
+    for key, value in sorted(client.metrics().items()):
+        print(f"  {key}: {value}")
+
+
+def _materials_valid(result: dict) -> bool:
+    """Полный ли результат: тип контента, 4 разных варианта в вопросах теста, нарратив."""
+    if result.get("status") != "success":
+        return False
+    materials = result["all_materials"]
+    if result["content_analysis"].get("primary_type") not in (
+        "NARRATIVE", "PROCESS", "STRUCTURE", "CONCEPT", "MIXED"
+    ):
+        return False
+    for question in materials["test"]["questions"]:
+        if question["type"] == "choice" and len(set(question["options"])) != 4:
+            return False
+    if result["content_analysis"]["primary_type"] == "NARRATIVE":
+        return "story" in materials["specialized_content"].get("narrative", {})
+    return True
+
+
+def run_engine_mode_benchmark(docs: int, latency: float) -> None:
+    """Сравнивает режимы движка multi и single: токены, вызовы, время, валидность."""
+    workdir = tempfile.mkdtemp(prefix="learngame-bench-")
+    os.chdir(workdir)
+    os.environ["LEARNGAME_CACHE_PATH"] = os.path.join(workdir, "results.sqlite3")
+    os.environ["LEARNGAME_JOBS_PATH"] = os.path.join(workdir, "jobs.sqlite3")
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import app as app_module
+    import learning_engine
+    from fake_groq import FakeGroq
+
+    corpus = []
+    for seed in range(docs):
+        path = os.path.join(workdir, f"doc{seed}.pdf")
+        with open(path, "wb") as f:
+            f.write(make_pdf(sample_pages(seed)))
+        corpus.append(path)
+    print(f"Корпус: {docs} документов, задержка LLM {latency * 1000:.0f} мс")
+    print(f"{'режим':<8} {'вызовов/док':>12} {'токенов/док':>12} {'мс/док':>10} {'валидных':>10}")
+
+    for mode in ("multi", "single"):
+        fake = FakeGroq(latency=latency)
+        app_module.client = fake
+        app_module.ENGINE_MODE = mode
+        times, valid = [], 0
+        for i, path in enumerate(corpus):
+            # Холодный прогон: без кэша результатов и общей мемоизации движка
+            app_module.result_cache.invalidate()
+            learning_engine._SHARED_MEMO.clear()
+            start = time.perf_counter()
+            result = app_module.process_document(path, f"doc{i}.pdf")
+            times.append(time.perf_counter() - start)
+            valid += _materials_valid(result)
+        print(
+            f"{mode:<8} {fake.calls / docs:>12.1f} {fake.total_tokens / docs:>12.0f} "
+            f"{statistics.mean(times) * 1000:>10.0f} {valid:>6}/{docs}"
+        )
+
+
+def run_search_benchmark(docs: int, queries: int) -> None:
+    """Задержка /search-запросов к индексу сущностей из docs синтетических документов."""
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from entity_index import EntityIndex
+
+    rng = random.Random(0)
+    names = ["Геракл", "Гера", "Зевс", "Афина", "Аполлон", "Персей", "Тесей", "Ахилл", "Одиссей"]
+    roles = ["герой", "богиня", "верховный бог", "царь", "прорицатель", "воин"]
+    index = EntityIndex(os.path.join(tempfile.mkdtemp(prefix="learngame-bench-"), "entities.sqlite3"))
+
+    start = time.perf_counter()
+    for doc in range(docs):
+        index.add_document(
+            f"doc{doc}",
+            f"lesson{doc}.pdf",
+            {
+                "characters": [
+                    {
+                        "name": f"{rng.choice(names)} {doc % 50}",
+                        "role": rng.choice(roles),
+                        "description": f"Персонаж урока {doc}",
+                    }
+                    for _ in range(10)
+                ],
+                "locations": [{"name": f"Локация {doc}", "description": "Место действия"}],
+                "events": [
+                    {"name": f"Подвиг {doc}", "description": "Событие", "participants": names[:2]}
+                ],
+            },
+        )
+    print(f"Индекс: {index.stats()['entities']} сущностей, построен за {time.perf_counter() - start:.2f} с")
+
+    times = []
+    for _ in range(queries):
+        query = rng.choice(names + roles)[: rng.randint(3, 6)]
+        start = time.perf_counter()
+        index.search(query)
+        times.append(time.perf_counter() - start)
+    print(
+        f"Поиск: p50 {_percentile(times, 50) * 1000:.2f} мс, "
+        f"p95 {_percentile(times, 95) * 1000:.2f} мс, max {max(times) * 1000:.2f} мс"
+    )
+
+
+def run_distractor_benchmark(questions: int, vocabulary: int) -> None:
+    """Скорость локального генератора дистракторов на словаре из vocabulary ролей."""
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from local_distractors import LocalDistractorGenerator
+
+    rng = random.Random(0)
+    heads = ["бог", "богиня", "царь", "царица", "герой", "жрец", "воин", "титан", "нимфа", "оракул"]
+    domains = ["войны", "морей", "мудрости", "охоты", "Олимпа", "Трои", "Итаки", "подземного мира"]
+    epithets = ["", "верховный", "молодой", "древний", "младший", "старший", "мудрый", "грозный"]
+    extras = ["", "и сын Зевса", "и покровитель городов", "и враг Геры", "из Аргоса", "из Фив"]
+    roles = sorted(
+        {f"{e} {h} {d} {x}".strip() for e in epithets for h in heads for d in domains for x in extras}
+    )
+    rng.shuffle(roles)
+    roles = roles[:vocabulary]
+
+    start = time.perf_counter()
+    generator = LocalDistractorGenerator(roles)
+    built = time.perf_counter() - start
+
+    pool = roles[:5]
+    start = time.perf_counter()
+    samples = [generator.distractors(rng.choice(roles), pool) for _ in range(questions)]
+    elapsed = time.perf_counter() - start
+    print(f"Словарь: {len(roles)} ролей, индекс за {built * 1000:.1f} мс")
+    print(f"{questions} вопросов за {elapsed * 1000:.1f} мс ({elapsed / questions * 1e6:.0f} мкс/вопрос)")
+    print("Пример: бог войны ->", generator.distractors("бог войны", pool))
+    print("Полных наборов по 3 варианта:", sum(len(s) == 3 for s in samples), "из", questions)
+
+
+def run_context_benchmark(chars: int, entities: int, budget: int) -> None:
+    """
+    Контекст промптов о сущностях: первые 1000 символов текста против фрагментов,
+    найденных BM25 по всему тексту. Сущности упоминаются в случайных местах книги.
+    """
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from chunking import CHARS_PER_TOKEN
+    from retrieval import PassageIndex
+
+    rng = random.Random(0)
+    names = [f"Персонаж{i}" for i in range(entities)]
+    words = ["город", "море", "корабль", "битва", "храм", "дорога", "царство", "оракул", "войско"]
+    paragraphs = []
+    size = 0
+    while size < chars:
+        sentences = [
+            " ".join(rng.choice(words) for _ in range(rng.randint(6, 14))).capitalize() + "."
+            for _ in range(rng.randint(2, 5))
+        ]
+        if rng.random() < 0.1:
+            sentences.insert(rng.randrange(len(sentences)), f"{rng.choice(names)} пришёл в город.")
+        paragraphs.append(" ".join(sentences))
+        size += len(paragraphs[-1]) + 2
+    text = "\n\n".join(paragraphs)
+
+    start = time.perf_counter()
+    index = PassageIndex(text)
+    built = time.perf_counter() - start
+
+    times = []
+    contexts = []
+    for name in names:
+        start = time.perf_counter()
+        contexts.append(index.context(name, budget))
+        times.append(time.perf_counter() - start)
+    prefix = text[:1000]
+    prefix_hits = sum(name in prefix for name in names)
+    hits = sum(name in context for name, context in zip(names, contexts))
+    tokens = [len(context) // CHARS_PER_TOKEN for context in contexts]
+    print(f"Текст: {len(text)} символов, {len(index.passages)} фрагментов, индекс за {built * 1000:.1f} мс")
+    print(
+        f"Запрос: p50 {_percentile(times, 50) * 1000:.2f} мс, "
+        f"p95 {_percentile(times, 95) * 1000:.2f} мс"
+    )
+    print(f"Префикс 1000 символов: ~{1000 // CHARS_PER_TOKEN} токенов, упоминает сущность {prefix_hits}/{entities}")
+    print(
+        f"BM25 (бюджет {budget}): ~{statistics.mean(tokens):.0f} токенов в среднем, "
+        f"упоминает сущность {hits}/{entities}"
+    )
+
+
+def run_review_benchmark(users: int, cards: int, batch: int, queries: int) -> None:
+    """
+    Интервальное повторение: приём пачек оценок (новые и повторные карточки)
+    и выборка очереди повторений для users пользователей по cards карточек.
+    """
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from spaced_repetition import DAY, ReviewStore
+
+    rng = random.Random(0)
+    store = ReviewStore(os.path.join(tempfile.mkdtemp(prefix="learngame-bench-"), "reviews.sqlite3"))
+    now = time.time()
+
+    def ingest(label: str, oldest: float, newest: float) -> None:
+        """Оценки со временем от oldest до newest дней назад."""
+        total = 0
+        batch_times = []
+        start = time.perf_counter()
+        for user in range(users):
+            for offset in range(0, cards, batch):
+                reviews = [
+                    (
+                        f"doc{user % 97}:{card}",
+                        rng.randint(0, 3),
+                        now - rng.uniform(newest, oldest) * DAY,
+                    )
+                    for card in range(offset, min(offset + batch, cards))
+                ]
+                batch_start = time.perf_counter()
+                store.review_many(f"user{user}", reviews)
+                batch_times.append(time.perf_counter() - batch_start)
+                total += len(reviews)
+        elapsed = time.perf_counter() - start
+        print(
+            f"{label}: {total} оценок за {elapsed:.1f} с ({total / elapsed:.0f} оценок/с), "
+            f"пачка из {batch}: p50 {_percentile(batch_times, 50) * 1000:.2f} мс, "
+            f"p95 {_percentile(batch_times, 95) * 1000:.2f} мс"
+        )
+
+    # Повторные оценки новее первых: более старые хранилище пропускает как дубликаты
+    ingest("Новые карточки", 30, 15)
+    ingest("Повторные оценки", 15, 0)
+
+    times = []
+    found = 0
+    for _ in range(queries):
+        start = time.perf_counter()
+        found += len(store.due(f"user{rng.randrange(users)}", limit=20))
+        times.append(time.perf_counter() - start)
+    print(
+        f"Очередь повторений ({users * cards} карточек): p50 {_percentile(times, 50) * 1000:.3f} мс, "
+        f"p95 {_percentile(times, 95) * 1000:.3f} мс, в среднем {found / queries:.1f} карточек"
+    )
+
+
+def _suite_responder(canned_path: str = None):
+    """
+    Ответы фейковой модели для набора бенчмарков: сначала подмены из файла
+    ([[подстрока промпта, ответ], ...]), иначе canned_response. Сущности помечаются
+    хэшем промпта, чтобы документы не попадали в общие кэши движка друг друга.
+    """
+    from fake_groq import canned_response
+
+    overrides = []
+    if canned_path:
+        with open(canned_path, encoding="utf-8") as f:
+            overrides = json.load(f)
+
+    def respond(prompt: str) -> Dict:
+        for marker, response in overrides:
+            if marker in prompt:
+                return response
+        response = canned_response(prompt)
+        if "characters" in response:
+            response = copy.deepcopy(response)
+            tag = hashlib.sha1(prompt.encode("utf-8")).hexdigest()[:8]
+            for char in response["characters"]:
+                char["description"] += f" [{tag}]"
+        return response
+
+    return respond
+
+
+def _latency_stats(values: List[float]) -> Dict[str, float]:
+    return {
+        "p50_ms": round(statistics.median(values) * 1000, 1),
+        "p95_ms": round(_percentile(values, 95) * 1000, 1),
+    }
+
+
+def run_benchmark_suite(
+    docs: int,
+    concurrency: int,
+    latency: float,
+    error_rate: float,
+    seed: int,
+    canned: str = None,
+    output: str = None,
+    baseline: str = None,
+    tolerance: float = 0.25,
+) -> int:
+    """
+    Полный конвейер против локального фейкового сервера Groq (настоящий SDK groq):
+    create_all_materials, память на документ и /upload под нагрузкой.
+    Возвращает код выхода: 1, если результат хуже baseline больше чем на tolerance.
+    """
+    import requests
+    import tracemalloc
+
+    random.seed(seed)
+    workdir = tempfile.mkdtemp(prefix="learngame-bench-")
+    os.chdir(workdir)
+    os.environ["LEARNGAME_CACHE_PATH"] = os.path.join(workdir, "results.sqlite3")
+    os.environ["LEARNGAME_JOBS_PATH"] = os.path.join(workdir, "jobs.sqlite3")
+    os.environ["LEARNGAME_INDEX_PATH"] = os.path.join(workdir, "entities.sqlite3")
+    os.environ["LEARNGAME_JOB_WORKERS"] = str(concurrency)
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from groq import Groq
+    import app as app_module
+    from fake_groq import serve_fake_groq
+    from learning_engine import LearningEngine
+    from llm_client import RateLimitedClient
+
+    respond = _suite_responder(canned)
+    fake = serve_fake_groq(latency=latency, error_rate=error_rate, seed=seed, respond=respond)
+    # Лимиты не мешают измерению, повторы после 429 — без долгих пауз
+    client = RateLimitedClient(
+        Groq(api_key="fake", base_url=f"http://127.0.0.1:{fake.server_port}", max_retries=0),
+        rpm=10**6,
+        tpm=10**9,
+        max_retries=5,
+        backoff_base=0.01,
+        backoff_max=0.05,
+    )
+    app_module.client = client
+    config = {
+        "docs": docs,
+        "concurrency": concurrency,
+        "latency": latency,
+        "error_rate": error_rate,
+        "seed": seed,
+        "engine_mode": app_module.ENGINE_MODE,
+        "distractor_mode": app_module.DISTRACTOR_MODE,
+    }
+    report: Dict[str, Any] = {"config": config}
+
+    # 1. LearningEngine.create_all_materials
+    times, calls = [], []
+    for i in range(docs):
+        text = "\n".join(sample_pages(i))
+        engine = LearningEngine(respond(text), text, client)
+        start = time.perf_counter()
+        engine.create_all_materials()
+        times.append(time.perf_counter() - start)
+        calls.append(engine.llm_calls)
+    report["engine"] = {**_latency_stats(times), "llm_calls_per_doc": statistics.mean(calls)}
+
+    # 2. Память на документ: пик выделений process_document (последовательно)
+    peaks = []
+    for i in range(min(docs, 5)):
+        path = os.path.join(workdir, f"memory{i}.pdf")
+        with open(path, "wb") as f:
+            f.write(make_pdf(sample_pages(10_000 + i)))
+        tracemalloc.start()
+        app_module.process_document(path, f"memory{i}.pdf")
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    report["memory"] = {
+        "peak_kib_mean": round(statistics.mean(peaks) / 1024, 1),
+        "peak_kib_max": round(max(peaks) / 1024, 1),
+    }
+
+    # 3. /upload с concurrency одновременных клиентов
+    server, thread, base_url = _start_server(app_module)
+
+    def upload(i: int) -> tuple:
+        pdf = make_pdf(sample_pages(20_000 + i))
+        start = time.perf_counter()
+        response = requests.post(
+            f"{base_url}/upload", files={"file": (f"doc{i}.pdf", pdf, "application/pdf")}
+        )
+        response.raise_for_status()
+        status_url = base_url + response.json()["status_url"]
+        while True:
+            job = requests.get(status_url).json()
+            if job["status"] in ("done", "failed"):
+                break
+            time.sleep(0.01)
+        return time.perf_counter() - start, job
+
+    try:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            uploads = list(pool.map(upload, range(docs)))
+        wall = time.perf_counter() - start
+    finally:
+        server.should_exit = True
+        thread.join()
+        fake.shutdown()
+
+    done = [job["result"] for _, job in uploads if job["status"] == "done"]
+    report["upload"] = {
+        **_latency_stats([elapsed for elapsed, _ in uploads]),
+        "throughput_docs_per_s": round(docs / wall, 2),
+        "llm_calls_per_doc": statistics.mean(r["llm_calls"] for r in done) if done else 0,
+        "failed": docs - len(done),
+    }
+    report["llm_client"] = {
+        key: value
+        for key, value in client.metrics().items()
+        if key in ("calls", "errors", "retries", "rate_limited")
+    }
+
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if not baseline:
+        return 0
+    with open(baseline, encoding="utf-8") as f:
+        base = json.load(f)
+    regressions = []
+    for section in ("engine", "upload"):
+        for key in ("p50_ms", "p95_ms"):
+            if report[section][key] > base[section][key] * (1 + tolerance):
+                regressions.append(f"{section}.{key}: {base[section][key]} -> {report[section][key]}")
+        if report[section]["llm_calls_per_doc"] > base[section]["llm_calls_per_doc"]:
+            regressions.append(
+                f"{section}.llm_calls_per_doc: {base[section]['llm_calls_per_doc']} -> "
+                f"{report[section]['llm_calls_per_doc']}"
+            )
+    if report["upload"]["throughput_docs_per_s"] < base["upload"]["throughput_docs_per_s"] * (1 - tolerance):
+        regressions.append(
+            f"upload.throughput_docs_per_s: {base['upload']['throughput_docs_per_s']} -> "
+            f"{report['upload']['throughput_docs_per_s']}"
+        )
+    if report["memory"]["peak_kib_max"] > base["memory"]["peak_kib_max"] * (1 + tolerance):
+        regressions.append(
+            f"memory.peak_kib_max: {base['memory']['peak_kib_max']} -> {report['memory']['peak_kib_max']}"
+        )
+    for line in regressions:
+        print("РЕГРЕССИЯ", line)
+    return 1 if regressions else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LearnGame AI benchmarks")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    load = commands.add_parser("load", help="нагрузочный тест /upload")
+    load.add_argument("--uploads", type=int, default=20)
+    load.add_argument("--latency", type=float, default=0.5, help="задержка фейкового LLM, с")
+
+    pdf = commands.add_parser("pdf", help="извлечение текста из PDF")
+    pdf.add_argument("--pages", type=int, default=400)
+    pdf.add_argument("--workers", type=int, default=max(2, os.cpu_count() or 1))
+    pdf.add_argument("--repeat", type=int, default=3)
+
+    backends = commands.add_parser("pdf-backends", help="бэкенды извлечения текста из PDF")
+    backends.add_argument("--files", nargs="*", default=[], help="PDF-фикстуры")
+    backends.add_argument("--pages", type=int, default=200)
+    backends.add_argument("--repeat", type=int, default=3)
+
+    llm = commands.add_parser("llm", help="клиент LLM против фейкового сервера Groq")
+    llm.add_argument("--requests", type=int, default=60)
+    llm.add_argument("--concurrency", type=int, default=10)
+    llm.add_argument("--rpm", type=int, default=30)
+    llm.add_argument("--tpm", type=int, default=60000)
+    llm.add_argument("--latency", type=float, default=0.1)
+    llm.add_argument("--error-rate", type=float, default=0.2)
+
+    engine = commands.add_parser("engine", help="режимы движка multi и single")
+    engine.add_argument("--docs", type=int, default=10)
+    engine.add_argument("--latency", type=float, default=0.2)
+
+    search = commands.add_parser("search", help="поиск по индексу сущностей")
+    search.add_argument("--docs", type=int, default=2000)
+    search.add_argument("--queries", type=int, default=500)
+
+    distractors = commands.add_parser("distractors", help="локальный генератор дистракторов")
+    distractors.add_argument("--questions", type=int, default=500)
+    distractors.add_argument("--vocabulary", type=int, default=2000)
+
+    context = commands.add_parser("context", help="контекст промптов: префикс против BM25")
+    context.add_argument("--chars", type=int, default=300000)
+    context.add_argument("--entities", type=int, default=40)
+    context.add_argument("--budget", type=int, default=300, help="бюджет контекста, токены")
+
+    reviews = commands.add_parser("reviews", help="интервальное повторение карточек")
+    reviews.add_argument("--users", type=int, default=2000)
+    reviews.add_argument("--cards", type=int, default=100)
+    reviews.add_argument("--batch", type=int, default=25)
+    reviews.add_argument("--queries", type=int, default=2000)
+
+    suite = commands.add_parser("suite", help="полный конвейер против фейкового сервера Groq")
+    suite.add_argument("--docs", type=int, default=20)
+    suite.add_argument("--concurrency", type=int, default=4)
+    suite.add_argument("--latency", type=float, default=0.05)
+    suite.add_argument("--error-rate", type=float, default=0.05)
+    suite.add_argument("--seed", type=int, default=0)
+    suite.add_argument("--canned", help="JSON с подменами ответов: [[подстрока, ответ], ...]")
+    suite.add_argument("--output", help="куда сохранить результаты (JSON)")
+    suite.add_argument("--baseline", help="результаты для сравнения (JSON)")
+    suite.add_argument("--tolerance", type=float, default=0.25)
+
+    args = parser.parse_args()
+    if args.command == "load":
+        run_load_test(args.uploads, args.latency)
+    elif args.command == "pdf":
+        run_pdf_benchmark(args.pages, args.workers, args.repeat)
+    elif args.command == "pdf-backends":
+        run_pdf_backend_benchmark(args.files, args.pages, args.repeat)
+    elif args.command == "llm":
+        run_llm_client_benchmark(
+            args.requests, args.concurrency, args.rpm, args.tpm, args.latency, args.error_rate
+        )
+    elif args.command == "engine":
+        run_engine_mode_benchmark(args.docs, args.latency)
+    elif args.command == "search":
+        run_search_benchmark(args.docs, args.queries)
+    elif args.command == "distractors":
+        run_distractor_benchmark(args.questions, args.vocabulary)
+    elif args.command == "context":
+        run_context_benchmark(args.chars, args.entities, args.budget)
+    elif args.command == "reviews":
+        run_review_benchmark(args.users, args.cards, args.batch, args.queries)
+    elif args.command == "suite":
+        sys.exit(
+            run_benchmark_suite(
+                args.docs,
+                args.concurrency,
+                args.latency,
+                args.error_rate,
+                args.seed,
+                args.canned,
+                args.output,
+                args.baseline,
+                args.tolerance,
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+LearnGame AI - Разбиение длинных текстов и слияние сущностей
+Используется для map-reduce извлечения сущностей из полных учебников.
+"""
+
+import re
+from typing import Dict, List
+
+# Грубая оценка: сколько символов текста приходится на один токен модели
+CHARS_PER_TOKEN = 3
+
+ENTITY_TYPES = ["characters", "locations", "events", "objects"]
+
+
+def split_into_chunks(text: str, token_budget: int = 2000, max_chunks: int = 48) -> List[str]:
+    """
+    Режет текст на окна не длиннее token_budget токенов по границам абзацев/строк.
+    Если окон больше max_chunks, берёт равномерную выборку по всей книге.
+    """
+    limit = token_budget * CHARS_PER_TOKEN
+    chunks: List[str] = []
+    current: List[str] = []
+    size = 0
+
+    for paragraph in re.split(r"\n\s*\n|\n", text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        # Слишком длинный абзац режем жёстко
+        while len(paragraph) > limit:
+            if current:
+                chunks.append("\n".join(current))
+                current, size = [], 0
+            chunks.append(paragraph[:limit])
+            paragraph = paragraph[limit:]
+        if size + len(paragraph) > limit and current:
+            chunks.append("\n".join(current))
+            current, size = [], 0
+        current.append(paragraph)
+        size += len(paragraph) + 1
+
+    if current:
+        chunks.append("\n".join(current))
+
+    if len(chunks) > max_chunks:
+        step = len(chunks) / max_chunks
+        chunks = [chunks[int(i * step)] for i in range(max_chunks)]
+    return chunks
+
+
+def normalize_name(name: str) -> str:
+    """Нормализует имя сущности для дедупликации: регистр, ё, пунктуация, пробелы."""
+    name = str(name).casefold().replace("ё", "е")
+    name = re.sub(r"[^\w\s-]", " ", name)
+    return " ".join(name.split())
+
+
+def merge_entities(parts: List[Dict]) -> Dict[str, List[Dict]]:
+    """
+    Сливает результаты извлечения по чанкам в один structured_data.
+    Одноимённые сущности объединяются: пустые поля дополняются, участники событий суммируются.
+    """
+    merged: Dict[str, List[Dict]] = {kind: [] for kind in ENTITY_TYPES}
+    index: Dict[str, Dict[str, Dict]] = {kind: {} for kind in ENTITY_TYPES}
+
+    for part in parts:
+        for kind in ENTITY_TYPES:
+            for entity in part.get(kind) or []:
+                if not isinstance(entity, dict) or not entity.get("name"):
+                    continue
+                key = normalize_name(entity["name"])
+                existing = index[kind].get(key)
+                if existing is None:
+                    entity = dict(entity)
+                    if "participants" in entity:
+                        entity["participants"] = list(entity["participants"] or [])
+                    index[kind][key] = entity
+                    merged[kind].append(entity)
+                    continue
+                for field, value in entity.items():
+                    if field == "participants":
+                        known = existing.setdefault("participants", [])
+                        known.extend(p for p in value or [] if p not in known)
+                    elif value and not existing.get(field):
+                        existing[field] = value
+
+    return merged
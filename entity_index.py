@@ -0,0 +1,318 @@
+"""
+LearnGame AI - Индекс сущностей по всем документам
+Персонажи, локации, события и объекты из structured_data каждого документа
+сохраняются в SQLite с полнотекстовым индексом FTS5: поиск по всем загрузкам
+и повторное использование прошлых извлечений без новых вызовов LLM.
+"""
+
+import json
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+from chunking import ENTITY_TYPES, normalize_name
+
+# Поля, которые можно дополнить из прошлых извлечений той же сущности
+ENRICHABLE_FIELDS = ("role", "description", "purpose")
+
+
+# Сколько совпадений ранжировать по bm25: стоимость ранжирования растёт с их числом
+MAX_CANDIDATES = 500
+
+
+def _fts_query(query: str) -> str:
+    """Запрос FTS5: каждое слово — префиксный терм, все термы обязательны."""
+    terms = re.findall(r"\w+", query.casefold())
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+def _entity_details(entity: Dict) -> str:
+    """Текст для поиска помимо имени: роль, описание, участники и т.д."""
+    parts = []
+    for key, value in entity.items():
+        if key == "name":
+            continue
+        if isinstance(value, list):
+            parts.extend(str(item) for item in value)
+        elif isinstance(value, str):
+            parts.append(value)
+    return " ".join(parts)
+
+
+def _merge_entity(stored: Dict, entity: Dict) -> Dict:
+    """
+    Дополняет сохранённую сущность: заполняются только отсутствующие и пустые поля,
+    списки объединяются без повторов. Непустые сохранённые значения не перезаписываются.
+    """
+    merged = dict(stored)
+    for key, value in entity.items():
+        if not value:
+            continue
+        current = merged.get(key)
+        if not current:
+            merged[key] = value
+        elif isinstance(current, list) and isinstance(value, list):
+            merged[key] = current + [item for item in value if item not in current]
+    return merged
+
+
+class EntityIndex:
+    """
+    Персистентный индекс сущностей на SQLite FTS5.
+    Одноимённая сущность хранится один раз (kind + нормализованное имя),
+    документы-источники — в отдельной таблице.
+    """
+
+    def __init__(self, path: str = "cache/entities.sqlite3"):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        # Базу делят процессы-воркеры: WAL и ожидание чужой записи вместо "database is locked"
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS entities (
+                id INTEGER PRIMARY KEY,
+                kind TEXT NOT NULL,
+                norm_name TEXT NOT NULL,
+                data TEXT NOT NULL,
+                updated_at REAL NOT NULL,
+                UNIQUE (kind, norm_name)
+            );
+            CREATE TABLE IF NOT EXISTS entity_documents (
+                entity_id INTEGER NOT NULL,
+                doc_hash TEXT NOT NULL,
+                filename TEXT NOT NULL,
+                PRIMARY KEY (entity_id, doc_hash)
+            );
+            CREATE INDEX IF NOT EXISTS idx_entity_documents_doc ON entity_documents(doc_hash);
+            CREATE VIRTUAL TABLE IF NOT EXISTS entities_fts USING fts5(
+                name, details, kind UNINDEXED,
+                tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+            );
+            """
+        )
+        self._conn.commit()
+
+    def has_document(self, doc_hash: str) -> bool:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM entity_documents WHERE doc_hash = ? LIMIT 1", (doc_hash,)
+            ).fetchone()
+        return row is not None
+
+    def add_document(self, doc_hash: str, filename: str, structured_data: Dict) -> int:
+        """
+        Индексирует сущности документа (заменяя прежние связи документа).
+        Уже известная сущность дополняется новыми непустыми полями. Возвращает число сущностей.
+        """
+        now = time.time()
+        count = 0
+        with self._lock:
+            previous = self._unlink(doc_hash)
+            for kind in ENTITY_TYPES:
+                for entity in structured_data.get(kind) or []:
+                    if not isinstance(entity, dict) or not entity.get("name"):
+                        continue
+                    entity_id = self._upsert(kind, entity, now)
+                    self._conn.execute(
+                        "INSERT OR IGNORE INTO entity_documents VALUES (?, ?, ?)",
+                        (entity_id, doc_hash, filename),
+                    )
+                    count += 1
+            self._drop_orphans(previous)
+            self._conn.commit()
+        return count
+
+    def _upsert(self, kind: str, entity: Dict, now: float) -> int:
+        norm_name = normalize_name(entity["name"])
+        row = self._conn.execute(
+            "SELECT id, data FROM entities WHERE kind = ? AND norm_name = ?", (kind, norm_name)
+        ).fetchone()
+        if row is None:
+            data = dict(entity)
+            entity_id = self._conn.execute(
+                "INSERT INTO entities (kind, norm_name, data, updated_at) VALUES (?, ?, ?, ?)",
+                (kind, norm_name, json.dumps(data, ensure_ascii=False), now),
+            ).lastrowid
+        else:
+            entity_id, stored = row
+            data = json.loads(stored)
+            merged = _merge_entity(data, entity)
+            if merged == data:
+                return entity_id
+            data = merged
+            self._conn.execute(
+                "UPDATE entities SET data = ?, updated_at = ? WHERE id = ?",
+                (json.dumps(data, ensure_ascii=False), now, entity_id),
+            )
+            self._conn.execute("DELETE FROM entities_fts WHERE rowid = ?", (entity_id,))
+        self._conn.execute(
+            "INSERT INTO entities_fts (rowid, name, details, kind) VALUES (?, ?, ?, ?)",
+            (entity_id, str(data["name"]), _entity_details(data), kind),
+        )
+        return entity_id
+
+    def remove_document(self, doc_hash: str) -> int:
+        """Убирает документ из индекса; сущности без других источников удаляются."""
+        with self._lock:
+            removed = self._unlink(doc_hash)
+            self._drop_orphans(removed)
+            self._conn.commit()
+        return len(removed)
+
+    def _unlink(self, doc_hash: str) -> List[int]:
+        """Удаляет связи документа; возвращает ID сущностей, с которыми он был связан."""
+        ids = [
+            entity_id
+            for (entity_id,) in self._conn.execute(
+                "SELECT entity_id FROM entity_documents WHERE doc_hash = ?", (doc_hash,)
+            )
+        ]
+        self._conn.execute("DELETE FROM entity_documents WHERE doc_hash = ?", (doc_hash,))
+        return ids
+
+    def _drop_orphans(self, entity_ids: List[int]) -> None:
+        """Удаляет из entity_ids сущности, у которых не осталось документов."""
+        for entity_id in entity_ids:
+            linked = self._conn.execute(
+                "SELECT 1 FROM entity_documents WHERE entity_id = ? LIMIT 1", (entity_id,)
+            ).fetchone()
+            if linked is None:
+                self._conn.execute("DELETE FROM entities_fts WHERE rowid = ?", (entity_id,))
+                self._conn.execute("DELETE FROM entities WHERE id = ?", (entity_id,))
+
+    def search(self, query: str, kind: Optional[str] = None, limit: int = 20) -> List[Dict[str, Any]]:
+        """
+        Ищет сущности по имени и описанию (совпадения в имени выше).
+        У каждой найденной сущности — список документов-источников.
+        """
+        match = _fts_query(query)
+        if not match:
+            return []
+        # Сначала совпадения в имени, затем в остальных полях; в каждой группе
+        # по bm25 ранжируются не больше MAX_CANDIDATES строк
+        sql = (
+            "SELECT rowid FROM (SELECT rowid, bm25(entities_fts, 10.0, 1.0) AS score "
+            "FROM entities_fts WHERE entities_fts MATCH ?"
+            + (" AND kind = ?" if kind else "")
+            + " LIMIT ?) ORDER BY score LIMIT ?"
+        )
+
+        with self._lock:
+            ids: List[int] = []
+            for expression in (f"name : ({match})", match):
+                params: List[Any] = [expression] + ([kind] if kind else [])
+                for (entity_id,) in self._conn.execute(sql, params + [MAX_CANDIDATES, limit]):
+                    if entity_id not in ids:
+                        ids.append(entity_id)
+                if len(ids) >= limit:
+                    break
+            ids = ids[:limit]
+            if not ids:
+                return []
+
+            placeholders = ",".join("?" * len(ids))
+            entities = {
+                entity_id: (kind_, data)
+                for entity_id, kind_, data in self._conn.execute(
+                    f"SELECT id, kind, data FROM entities WHERE id IN ({placeholders})", ids
+                )
+            }
+            documents: Dict[int, List[Dict[str, str]]] = {}
+            for entity_id, doc_hash, filename in self._conn.execute(
+                "SELECT entity_id, doc_hash, filename FROM entity_documents "
+                f"WHERE entity_id IN ({placeholders})",
+                ids,
+            ):
+                documents.setdefault(entity_id, []).append(
+                    {"doc_hash": doc_hash, "filename": filename}
+                )
+
+        rows = [(entity_id, *entities[entity_id]) for entity_id in ids if entity_id in entities]
+        return [
+            {"kind": kind_, **json.loads(data), "documents": documents.get(entity_id, [])}
+            for entity_id, kind_, data in rows
+        ]
+
+    def enrich(self, structured_data: Dict) -> Dict:
+        """
+        Дополняет пустые поля сущностей (роль, описание, назначение) данными
+        прошлых извлечений той же сущности из других документов.
+        """
+        lookups = [
+            (kind, entity)
+            for kind in ENTITY_TYPES
+            for entity in structured_data.get(kind) or []
+            if isinstance(entity, dict)
+            and entity.get("name")
+            and any(field in entity and not entity[field] for field in ENRICHABLE_FIELDS)
+        ]
+        if not lookups:
+            return structured_data
+
+        with self._lock:
+            for kind, entity in lookups:
+                row = self._conn.execute(
+                    "SELECT data FROM entities WHERE kind = ? AND norm_name = ?",
+                    (kind, normalize_name(entity["name"])),
+                ).fetchone()
+                if row is None:
+                    continue
+                known = json.loads(row[0])
+                for field in ENRICHABLE_FIELDS:
+                    if field in entity and not entity[field] and known.get(field):
+                        entity[field] = known[field]
+        return structured_data
+
+    def role_vocabulary(self, names: Iterable[str] = (), limit: int = 2000) -> List[str]:
+        """
+        Роли персонажей для локальных дистракторов, от частых к редким.
+        Сначала — из документов той же темы (где встречаются сущности names),
+        затем из всего индекса.
+        """
+        norm_names = list({normalize_name(name) for name in names if name})
+        queries = []
+        if norm_names:
+            placeholders = ",".join("?" * len(norm_names))
+            related = (
+                "SELECT d.doc_hash FROM entity_documents d JOIN entities e ON e.id = d.entity_id "
+                f"WHERE e.norm_name IN ({placeholders})"
+            )
+            queries.append((f"AND d.doc_hash IN ({related})", norm_names))
+        queries.append(("", []))
+
+        roles: List[str] = []
+        seen = set()
+        with self._lock:
+            for condition, params in queries:
+                rows = self._conn.execute(
+                    "SELECT json_extract(e.data, '$.role') AS role, COUNT(*) AS uses "
+                    "FROM entities e JOIN entity_documents d ON d.entity_id = e.id "
+                    f"WHERE e.kind = 'characters' AND role != '' {condition} "
+                    "GROUP BY role ORDER BY uses DESC LIMIT ?",
+                    params + [limit],
+                ).fetchall()
+                for role, _ in rows:
+                    key = normalize_name(role)
+                    if key and key not in seen:
+                        seen.add(key)
+                        roles.append(role)
+                if len(roles) >= limit:
+                    break
+        return roles[:limit]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            (documents,) = self._conn.execute(
+                "SELECT COUNT(DISTINCT doc_hash) FROM entity_documents"
+            ).fetchone()
+            (entities,) = self._conn.execute("SELECT COUNT(*) FROM entities").fetchone()
+            by_kind = dict(
+                self._conn.execute("SELECT kind, COUNT(*) FROM entities GROUP BY kind")
+            )
+        return {"documents": documents, "entities": entities, "by_kind": by_kind}
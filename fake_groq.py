@@ -0,0 +1,195 @@
+"""
+LearnGame AI - Фейковый Groq для нагрузочных тестов и бенчмарков
+FakeGroq повторяет интерфейс client.chat.completions.create в процессе,
+serve_fake_groq поднимает локальный HTTP-сервер с API Groq (для настоящего
+клиента groq через GROQ_BASE_URL). Ответы — заготовленный JSON с настраиваемой
+задержкой и долей ошибок 429, без сети и без API-ключа.
+"""
+
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from typing import Callable, Dict, List
+
+
+ENTITIES = {
+    "characters": [
+        {"name": "Геракл", "role": "герой", "description": "Сын Зевса"},
+        {"name": "Гера", "role": "богиня", "description": "Жена Зевса"},
+        {"name": "Зевс", "role": "верховный бог", "description": "Правитель Олимпа"},
+    ],
+    "locations": [{"name": "Немея", "description": "Место, где жил лев"}],
+    "events": [
+        {
+            "name": "Убийство немейского льва",
+            "description": "Первый подвиг Геракла",
+            "participants": ["Геракл"],
+        }
+    ],
+    "objects": [{"name": "Палица", "purpose": "Оружие Геракла"}],
+}
+
+CONTENT_ANALYSIS = {
+    "primary_type": "NARRATIVE",
+    "confidence": 0.9,
+    "reason": "Есть персонажи и хронология событий",
+}
+
+DISTRACTORS = ["Бог морей", "Бог кузнечного дела", "Царь богов"]
+
+NARRATIVE = {
+    "story": "Геракл отправляется в Немею, чтобы совершить первый подвиг.",
+    "dialog": {
+        "participants": ["Геракл", "Зевс"],
+        "lines": [
+            {"speaker": "Зевс", "text": "Тебя ждут двенадцать подвигов."},
+            {"speaker": "Геракл", "text": "Я готов, отец."},
+        ],
+    },
+    "interactive_questions": [
+        {
+            "question": "Какой подвиг был первым?",
+            "options": ["Немейский лев", "Гидра", "Керберос", "Авгиевы конюшни"],
+            "correct": 0,
+        }
+    ],
+}
+
+
+def canned_response(prompt: str) -> Dict:
+    """Подбирает заготовленный ответ по содержимому промпта."""
+    if '"content_analysis"' in prompt:
+        # Единый запрос: все поля сразу
+        return {
+            **ENTITIES,
+            "content_analysis": CONTENT_ANALYSIS,
+            "distractors": {
+                char["name"]: [d for d in DISTRACTORS if d != char["role"]]
+                for char in ENTITIES["characters"]
+            },
+            "narrative": NARRATIVE,
+        }
+    if '"distractors"' in prompt:
+        return {"distractors": DISTRACTORS}
+    if '"primary_type"' in prompt:
+        return CONTENT_ANALYSIS
+    if '"story"' in prompt:
+        return NARRATIVE
+    return ENTITIES
+
+
+class _Completions:
+    def __init__(self, owner: "FakeGroq"):
+        self._owner = owner
+
+    def create(self, messages: List[Dict], model: str, temperature: float = 0.0, max_tokens: int = 0, **kwargs):
+        owner = self._owner
+        time.sleep(owner.latency)
+        prompt = messages[-1]["content"]
+        content = json.dumps(canned_response(prompt), ensure_ascii=False)
+        usage = SimpleNamespace(
+            prompt_tokens=len(prompt) // 3, completion_tokens=len(content) // 3
+        )
+        usage.total_tokens = usage.prompt_tokens + usage.completion_tokens
+        with owner._lock:
+            owner.calls += 1
+            owner.total_tokens += usage.total_tokens
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+            usage=usage,
+        )
+
+
+class FakeGroq:
+    """Заглушка Groq: блокирует поток на latency секунд, как сетевой вызов."""
+
+    def __init__(self, latency: float = 0.5):
+        self.latency = latency
+        self.calls = 0
+        self.total_tokens = 0
+        self._lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=_Completions(self))
+
+
+def serve_fake_groq(
+    host: str = "127.0.0.1",
+    port: int = 0,
+    latency: float = 0.5,
+    error_rate: float = 0.0,
+    seed: int = 0,
+    respond: Callable[[str], Dict] = canned_response,
+) -> ThreadingHTTPServer:
+    """
+    Запускает фейковый сервер Groq в фоновом потоке.
+    Клиент: Groq(api_key="fake", base_url=f"http://{host}:{server.server_port}").
+    respond(prompt) возвращает JSON ответа модели (по умолчанию canned_response).
+    """
+    rng = random.Random(seed)
+    rng_lock = threading.Lock()
+    stats = {"requests": 0, "errors": 0}
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            with rng_lock:
+                stats["requests"] += 1
+                fail = rng.random() < error_rate
+                if fail:
+                    stats["errors"] += 1
+            time.sleep(latency)
+
+            if fail:
+                self._reply(
+                    429,
+                    {"error": {"message": "Rate limit reached", "type": "tokens"}},
+                    {"retry-after": "0"},
+                )
+                return
+
+            prompt = body["messages"][-1]["content"]
+            content = json.dumps(respond(prompt), ensure_ascii=False)
+            prompt_tokens = len(prompt) // 3
+            completion_tokens = len(content) // 3
+            self._reply(
+                200,
+                {
+                    "id": f"chatcmpl-{stats['requests']}",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": body.get("model", "fake"),
+                    "choices": [
+                        {
+                            "index": 0,
+                            "message": {"role": "assistant", "content": content},
+                            "finish_reason": "stop",
+                        }
+                    ],
+                    "usage": {
+                        "prompt_tokens": prompt_tokens,
+                        "completion_tokens": completion_tokens,
+                        "total_tokens": prompt_tokens + completion_tokens,
+                    },
+                },
+            )
+
+        def _reply(self, status: int, payload: Dict, headers: Dict = None):
+            data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    server.stats = stats
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
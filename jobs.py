@@ -0,0 +1,275 @@
+"""
+LearnGame AI - Очередь фоновых задач
+Задачи хранятся в SQLite, обрабатываются пулом потоков-воркеров; HTTP-запрос
+только ставит задачу в очередь и сразу возвращает её ID. Одну базу могут делить
+несколько процессов: выполняемая задача держит аренду, которую продлевает её процесс,
+а задачи с истёкшей арендой (процесс упал) возвращаются в очередь.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(Exception):
+    """В очереди слишком много ожидающих задач."""
+
+
+class JobQueue:
+    """SQLite-очередь задач с ограниченным числом воркеров и ожидающих задач."""
+
+    def __init__(
+        self,
+        handler: Callable[[Dict[str, Any]], Dict[str, Any]],
+        path: str = "cache/jobs.sqlite3",
+        workers: int = 2,
+        max_pending: int = 50,
+        poll_interval: float = 1.0,
+        lease: float = 60.0,
+    ):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.max_pending = max_pending
+        self.poll_interval = poll_interval
+        # Через сколько секунд без продления аренды задачу можно забрать у её процесса
+        self.lease = lease
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._heartbeat_stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._heartbeat_thread: Optional[threading.Thread] = None
+        self._conn = sqlite3.connect(
+            path, check_same_thread=False, isolation_level=None, timeout=30
+        )
+        # WAL: чтение статусов не блокируется записью из других процессов
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                result TEXT,
+                error TEXT,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                owner TEXT,
+                heartbeat_at REAL
+            );
+            CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, created_at);
+            """
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        for column, kind in (("owner", "TEXT"), ("heartbeat_at", "REAL")):
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+
+    def start(self) -> None:
+        """Возвращает в очередь задачи упавших процессов и запускает воркеров."""
+        self.requeue_stale()
+        self._stopping.clear()
+        self._heartbeat_stop.clear()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        self._heartbeat_thread = threading.Thread(
+            target=self._heartbeat, name="job-heartbeat", daemon=True
+        )
+        self._heartbeat_thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> int:
+        """
+        Перестаёт брать новые задачи и ждёт завершения текущих (не дольше timeout).
+        Возвращает число задач, которые не успели завершиться: после истечения
+        аренды их заберут другие процессы или следующий запуск.
+        """
+        self._stopping.set()
+        self._wakeup.set()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(None if deadline is None else max(0.0, deadline - time.monotonic()))
+        self._threads = [thread for thread in self._threads if thread.is_alive()]
+        unfinished = self.running()
+        # Аренда продлевается, пока задачи не завершились
+        if not unfinished:
+            self._heartbeat_stop.set()
+        return unfinished
+
+    def running(self) -> int:
+        """Сколько задач этого процесса выполняется сейчас."""
+        with self._lock:
+            (count,) = self._conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = 'running' AND owner = ?", (self.owner,)
+            ).fetchone()
+        return count
+
+    def requeue_stale(self) -> int:
+        """Возвращает в очередь выполняемые задачи, аренда которых истекла."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = 'queued', started_at = NULL, owner = NULL "
+                "WHERE status = 'running' AND (heartbeat_at IS NULL OR heartbeat_at < ?)",
+                (time.time() - self.lease,),
+            )
+        if cursor.rowcount:
+            logger.warning("Возвращено в очередь прерванных задач: %d", cursor.rowcount)
+        return cursor.rowcount
+
+    def _heartbeat(self) -> None:
+        """Продлевает аренду задач этого процесса и подбирает брошенные чужие."""
+        while not self._heartbeat_stop.wait(self.lease / 3):
+            try:
+                with self._lock:
+                    self._conn.execute(
+                        "UPDATE jobs SET heartbeat_at = ? WHERE status = 'running' AND owner = ?",
+                        (time.time(), self.owner),
+                    )
+                self.requeue_stale()
+            except sqlite3.Error:
+                logger.exception("Не удалось продлить аренду задач")
+
+    def submit(self, payload: Dict[str, Any]) -> str:
+        """Ставит задачу в очередь. Бросает QueueFullError, если очередь заполнена."""
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            (pending,) = self._conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = 'queued'"
+            ).fetchone()
+            if pending >= self.max_pending:
+                raise QueueFullError(f"В очереди уже {pending} задач")
+            self._conn.execute(
+                "INSERT INTO jobs (id, status, payload, created_at) VALUES (?, 'queued', ?, ?)",
+                (job_id, json.dumps(payload, ensure_ascii=False), time.time()),
+            )
+        self._wakeup.set()
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Статус задачи и, если готово, её результат."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, status, result, error, created_at, started_at, finished_at "
+                "FROM jobs WHERE id = ?",
+                (job_id,),
+            ).fetchone()
+            if row is None:
+                return None
+            position = None
+            if row[1] == "queued":
+                (position,) = self._conn.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND created_at <= ?",
+                    (row[4],),
+                ).fetchone()
+
+        job = {
+            "job_id": row[0],
+            "status": row[1],
+            "created_at": row[4],
+            "started_at": row[5],
+            "finished_at": row[6],
+        }
+        if position is not None:
+            job["queue_position"] = position
+        if row[2] is not None:
+            job["result"] = json.loads(row[2])
+        if row[3] is not None:
+            job["error"] = row[3]
+        return job
+
+    def stats(self) -> Dict[str, int]:
+        """Количество задач по статусам."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT status, COUNT(*) FROM jobs GROUP BY status"
+            ).fetchall()
+        stats = {"queued": 0, "running": 0, "done": 0, "failed": 0}
+        stats.update(dict(rows))
+        stats["workers"] = self.workers
+        stats["max_pending"] = self.max_pending
+        return stats
+
+    def active_payloads(self) -> List[Dict[str, Any]]:
+        """Данные ожидающих и выполняемых задач (например, чтобы не удалить их файлы)."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT payload FROM jobs WHERE status IN ('queued', 'running')"
+            ).fetchall()
+        return [json.loads(payload) for (payload,) in rows]
+
+    def purge(self, older_than: float) -> int:
+        """Удаляет завершённые задачи старше older_than секунд."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM jobs WHERE status IN ('done', 'failed') AND finished_at < ?",
+                (time.time() - older_than,),
+            )
+        return cursor.rowcount
+
+    def _claim(self) -> Optional[tuple]:
+        """Атомарно забирает самую старую ожидающую задачу."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT id, payload FROM jobs WHERE status = 'queued' "
+                    "ORDER BY created_at LIMIT 1"
+                ).fetchone()
+                if row is not None:
+                    now = time.time()
+                    self._conn.execute(
+                        "UPDATE jobs SET status = 'running', started_at = ?, owner = ?, "
+                        "heartbeat_at = ? WHERE id = ?",
+                        (now, self.owner, now, row[0]),
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return row
+
+    def _finish(self, job_id: str, result: Optional[Dict], error: Optional[str]) -> None:
+        # Задачу с истёкшей арендой мог забрать другой процесс — тогда результат за ним
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ? "
+                "WHERE id = ? AND owner = ?",
+                (
+                    "failed" if error else "done",
+                    json.dumps(result, ensure_ascii=False) if result is not None else None,
+                    error,
+                    time.time(),
+                    job_id,
+                    self.owner,
+                ),
+            )
+
+    def _worker(self) -> None:
+        while not self._stopping.is_set():
+            claimed = self._claim()
+            if claimed is None:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+
+            job_id, payload = claimed
+            try:
+                result = self.handler(json.loads(payload))
+            except Exception as e:
+                logger.exception("Задача %s упала: %s", job_id, e)
+                self._finish(job_id, None, str(e))
+            else:
+                error = result.get("error") if isinstance(result, dict) else None
+                self._finish(job_id, result, error)
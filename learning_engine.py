@@ -3,42 +3,344 @@ LearnGame AI - Движок для создания обучающих мате
 Улучшенная версия с интеллектуальной генерацией тестов
 """
 
+import copy
+import hashlib
 import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime
-from typing import Dict, List, Any
+from typing import Dict, Iterable, Iterator, List, Any, Callable, Optional, Tuple
 from groq import Groq
+from chunking import CHARS_PER_TOKEN, ENTITY_TYPES
+from local_distractors import LocalDistractorGenerator
+from llm_json import (
+    COMBINED_SCHEMA,
+    CONTENT_ANALYSIS_SCHEMA,
+    DISTRACTORS_SCHEMA,
+    NARRATIVE_SCHEMA,
+    matches_schema,
+    parse_llm_json,
+)
+from metrics import Timings, propagate_context, span, use_timings
+from retrieval import CONTEXT_TOKENS, PassageIndex
+
+logger = logging.getLogger(__name__)
+# Общий (между экземплярами движка) кэш LLM-результатов по хэшу structured_data
+_SHARED_MEMO: "OrderedDict[Tuple, Any]" = OrderedDict()
+_SHARED_MEMO_SIZE = 1024
+_SHARED_MEMO_LOCK = threading.Lock()
+
+
+def _hash_text(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+CONTENT_TYPES = {"NARRATIVE", "PROCESS", "STRUCTURE", "CONCEPT", "MIXED"}
+
+
+def request_combined_materials(groq_client, text: str) -> Optional[Dict]:
+    """
+    Режим одного запроса: сущности, тип контента, дистракторы для каждого
+    персонажа и нарратив одним JSON-ответом. None, если ответ не удалось разобрать;
+    отдельные недостающие поля движок потом дозапрашивает обычными вызовами.
+    """
+    prompt = f"""
+    Ты — образовательный ассистент и сценарист обучающей игры. За ОДИН ответ подготовь все данные по тексту.
+
+    1. Сущности:
+       - characters: name, role (герой, бог, учитель и т.д.), description (1-2 предложения)
+       - locations: name, description
+       - events: name, description, participants (список имен)
+       - objects: name, purpose
+    2. content_analysis — тип контента: NARRATIVE (персонажи и хронология), PROCESS (шаги),
+       STRUCTURE (части системы), CONCEPT (теории и понятия) или MIXED.
+    3. distractors — для каждого из первых 5 персонажей 3 НЕПРАВИЛЬНЫХ, но правдоподобных
+       и релевантных теме варианта его роли (правильную роль не включай).
+    4. narrative (только для NARRATIVE): краткий сюжет (3-5 предложений), диалог двух главных
+       персонажей (4-6 реплик) и 2 вопроса по сюжету с 4 вариантами ответа.
+
+    ВЕРНИ ТОЛЬКО ВАЛИДНЫЙ JSON БЕЗ ПОЯСНЕНИЙ по формату:
+    {{
+      "characters": [{{"name": "...", "role": "...", "description": "..."}}],
+      "locations": [{{"name": "...", "description": "..."}}],
+      "events": [{{"name": "...", "description": "...", "participants": ["..."]}}],
+      "objects": [{{"name": "...", "purpose": "..."}}],
+      "content_analysis": {{"primary_type": "NARRATIVE", "confidence": 0.95, "reason": "..."}},
+      "distractors": {{"имя персонажа": ["вариант1", "вариант2", "вариант3"]}},
+      "narrative": {{
+        "story": "...",
+        "dialog": {{"participants": ["...", "..."], "lines": [{{"speaker": "...", "text": "..."}}]}},
+        "interactive_questions": [{{"question": "...", "options": ["...", "...", "...", "..."], "correct": 0}}]
+      }}
+    }}
+
+    Текст для анализа:
+    {text[:8000]}
+    """
+
+    try:
+        chat_completion = groq_client.chat.completions.create(
+            messages=[{"role": "user", "content": prompt}],
+            model="llama-3.3-70b-versatile",
+            temperature=0.5,
+            max_tokens=6000,
+        )
+        response = chat_completion.choices[0].message.content
+
+        with span("json_parse"):
+            return parse_llm_json(response, COMBINED_SCHEMA)
+
+    except Exception as e:
+        logger.error("Ошибка единого запроса: %s", e)
+
+    return None
+
+
+def combined_entities(combined: Optional[Dict]) -> Optional[Dict]:
+    """Сущности из ответа единого запроса; None, если среди них нет ни одного персонажа или события."""
+    if not combined:
+        return None
+    entities = {
+        kind: [
+            item
+            for item in combined.get(kind) or []
+            if isinstance(item, dict) and item.get("name")
+        ]
+        for kind in ENTITY_TYPES
+    }
+    if not entities["characters"] and not entities["events"]:
+        return None
+    return entities
+
+
+# Этап графа: (список зависимостей, функция от словаря готовых результатов)
+Stage = Tuple[List[str], Callable[[Dict[str, Any]], Any]]
+
+
+def _iter_task_graph(stages: Dict[str, Stage]) -> Iterator[Tuple[str, Any, float]]:
+    """
+    Выполняет этапы параллельно, запуская каждый, как только готовы его зависимости.
+    Отдаёт (имя, результат, секунды) в порядке завершения этапов.
+    """
+    results: Dict[str, Any] = {}
+    pending = dict(stages)
+    running = {}
+
+    def timed(name, fn):
+        start = time.perf_counter()
+        result = fn(results)
+        return name, result, time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=len(stages) or 1) as pool:
+        while pending or running:
+            for name, (deps, fn) in list(pending.items()):
+                if all(dep in results for dep in deps):
+                    del pending[name]
+                    running[pool.submit(timed, name, fn)] = name
+            if not running:
+                raise ValueError(f"Неразрешимые зависимости этапов: {list(pending)}")
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                del running[future]
+                name, result, elapsed = future.result()
+                results[name] = result
+                yield name, result, elapsed
 
 
 class LearningEngine:
     """Минимальный движок для создания обучающих материалов."""
 
-    def __init__(self, structured_data: Dict, raw_text: str = "", groq_client=None):
+    def __init__(
+        self,
+        structured_data: Dict,
+        raw_text: str = "",
+        groq_client=None,
+        distractor_concurrency: int = 5,
+        timings: Optional[Timings] = None,
+        combined: Optional[Dict] = None,
+        distractor_mode: str = "llm",
+        role_vocabulary: Iterable[str] = (),
+        context_tokens: int = CONTEXT_TOKENS,
+    ):
         self.data = structured_data
-        self.raw_text = raw_text[:5000]
+        # Весь извлечённый текст: в промпты идут только фрагменты о нужной сущности
+        self.raw_text = raw_text
+        self.context_tokens = context_tokens
+        self._passages: Optional[PassageIndex] = None
+        self._passages_lock = threading.Lock()
         self.groq_client = groq_client  # <-- КЛЮЧЕВАЯ СТРОКА
+        # Сколько запросов дистракторов выполнять параллельно (1 = последовательно)
+        self.distractor_concurrency = max(1, distractor_concurrency)
+        # Сборщик таймингов запроса (этапы, вызовы LLM, разбор JSON), если нужен
+        self.timings = timings
+        # "llm" — дистракторы от модели (локальные при сбое), "local" — только локальные
+        self.distractor_mode = distractor_mode
+        self._local_distractors = LocalDistractorGenerator(role_vocabulary)
         self.cards = []
         self.test_questions = []
+        # Мемоизация LLM-артефактов и счётчик реальных вызовов модели
+        self.llm_calls = 0
+        self._memo: Dict[Tuple, Any] = {}
+        self._memo_lock = threading.Lock()
+        self._data_hash = _hash_text(
+            json.dumps(structured_data, sort_keys=True, ensure_ascii=False)
+        )
+        if combined:
+            self._seed_combined(combined)
+
+    def _seed_combined(self, combined: Dict) -> None:
+        """
+        Заполняет мемо корректными полями ответа единого запроса.
+        Отсутствующие или невалидные поля остаются пустыми и запрашиваются обычным путём.
+        """
+        analysis = combined.get("content_analysis")
+        if (
+            matches_schema(analysis, CONTENT_ANALYSIS_SCHEMA)
+            and analysis["primary_type"] in CONTENT_TYPES
+        ):
+            self._memo[("content_analysis",)] = analysis
+
+        narrative = combined.get("narrative")
+        if matches_schema(narrative, NARRATIVE_SCHEMA):
+            self._memo[("narrative",)] = narrative
+
+        distractors = combined.get("distractors")
+        if not isinstance(distractors, dict) or not self.raw_text:
+            return
+        for char in self.data.get("characters", [])[:5]:
+            name = char.get("name", "")
+            role = char.get("role", "Неизвестно")
+            context_hash = _hash_text(self._entity_context(name))
+            options = [
+                d
+                for d in distractors.get(name) or []
+                if isinstance(d, str) and d.strip() and d.lower() != str(role).lower()
+            ]
+            if len(options) >= 3:
+                self._memo[("distractors", name, role, context_hash)] = options[:3]
+
+    def _entity_context(self, name: str) -> str:
+        """
+        Фрагменты текста, упоминающие сущность, в пределах context_tokens (BM25 по всему тексту).
+        Если имя в тексте не встречается — начало текста того же размера.
+        """
+        if not self.raw_text:
+            return ""
+        with self._passages_lock:
+            if self._passages is None:
+                with span("passage_index"):
+                    self._passages = PassageIndex(self.raw_text)
+        return self._passages.context(name, self.context_tokens) or self.raw_text[
+            : self.context_tokens * CHARS_PER_TOKEN
+        ]
+
+    def _chat(
+        self, prompt: str, temperature: float, max_tokens: int, cacheable: bool = True
+    ) -> str:
+        """
+        Отправляет один запрос к модели и учитывает его в счётчике вызовов.
+        cacheable=False отключает кэш промптов клиента (творческие запросы).
+        """
+        extra = {}
+        if not cacheable and getattr(self.groq_client, "prompt_cache", None) is not None:
+            extra["cache"] = False
+        chat_completion = self.groq_client.chat.completions.create(
+            messages=[{"role": "user", "content": prompt}],
+            model="llama-3.3-70b-versatile",
+            temperature=temperature,
+            max_tokens=max_tokens,
+            **extra,
+        )
+        # Ответы из кэша промптов не считаются вызовами модели
+        if not getattr(chat_completion, "cached", False):
+            with self._memo_lock:
+                self.llm_calls += 1
+        return chat_completion.choices[0].message.content
+
+    def _memoized(self, key: Tuple, compute: Callable[[], Any], shared: bool = True) -> Any:
+        """
+        Вычисляет LLM-артефакт не более одного раза на документ.
+        Неудачные результаты (None или {"error": ...}) не попадают в общий кэш;
+        shared=False — только в память этого движка (творческие запросы без кэша).
+        """
+        with self._memo_lock:
+            if key in self._memo:
+                return self._memo[key]
+
+        shared_key = (self._data_hash,) + key
+        result = None
+        if shared:
+            with _SHARED_MEMO_LOCK:
+                result = _SHARED_MEMO.get(shared_key)
+                if result is not None:
+                    _SHARED_MEMO.move_to_end(shared_key)
+                    result = copy.deepcopy(result)
+
+        if result is None:
+            result = compute()
+            if (
+                shared
+                and result is not None
+                and not (isinstance(result, dict) and "error" in result)
+            ):
+                with _SHARED_MEMO_LOCK:
+                    _SHARED_MEMO[shared_key] = copy.deepcopy(result)
+                    while len(_SHARED_MEMO) > _SHARED_MEMO_SIZE:
+                        _SHARED_MEMO.popitem(last=False)
+
+        with self._memo_lock:
+            self._memo[key] = result
+        return result
 
     def _generate_contextual_distractors(
         self, correct_role: str, character_name: str, context: str = ""
     ) -> List[str]:
         """
         Генерирует контекстно-релевантные неправильные варианты ответов через Groq API.
+        В режиме "local", без клиента Groq или при ошибке модели — локальным генератором.
         """
-        if not self.groq_client or not context:
-            # Фолбэк на базовые варианты, если нет клиента Groq
-            fallback_distractors = [
-                "Другой персонаж",
-                "Второстепенный герой",
-                "Неизвестная личность",
-                "Вымышленный персонаж",
-            ]
-            return [d for d in fallback_distractors if d != correct_role][:3]
+        if self.distractor_mode == "local" or not self.groq_client or not context:
+            return self._local_distractor_options(correct_role, character_name)
 
+        distractors = self._memoized(
+            ("distractors", character_name, correct_role, _hash_text(context)),
+            lambda: self._request_distractors(correct_role, character_name, context),
+        )
+        if distractors is not None:
+            return distractors
+
+        # Фолбэк
+        return self._local_distractor_options(correct_role, character_name)
+
+    def _local_distractor_options(self, correct_role: str, character_name: str) -> List[str]:
+        """Дистракторы из ролей других персонажей и словаря ролей, без вызова модели."""
+        pool = [
+            char.get("role", "")
+            for char in self.data.get("characters", [])
+            if char.get("name") != character_name
+        ]
+        distractors = self._local_distractors.distractors(correct_role, pool)
+
+        # Совсем нет кандидатов (один персонаж, пустой словарь) — базовые варианты
+        for fallback in ("Другой персонаж", "Второстепенная роль", "Неизвестная роль"):
+            if len(distractors) >= 3:
+                break
+            if fallback != correct_role and fallback not in distractors:
+                distractors.append(fallback)
+        return distractors
+
+    def _request_distractors(
+        self, correct_role: str, character_name: str, context: str
+    ) -> Optional[List[str]]:
+        """Запрашивает дистракторы у модели; None, если ответ не удалось разобрать."""
         prompt = f"""
         На основе следующего контекста сгенерируй 3 НЕПРАВИЛЬНЫХ, но контекстно-релевантных варианта ответа.
         
-        Контекст: {context[:1000]}
+        Контекст: {context}
         
         Персонаж: {character_name}
         Правильная роль: {correct_role}
@@ -59,22 +361,15 @@ class LearningEngine:
         """
 
         try:
-            chat_completion = self.groq_client.chat.completions.create(
-                messages=[{"role": "user", "content": prompt}],
-                model="llama-3.3-70b-versatile",
-                temperature=0.7,  # Немного выше для разнообразия
-                max_tokens=500,
+            response = self._chat(
+                prompt, temperature=0.7, max_tokens=500  # Немного выше для разнообразия
             )
 
-            response = chat_completion.choices[0].message.content
-
-            # Ищем JSON в ответе
-            start = response.find("{")
-            end = response.rfind("}") + 1
-            if start != -1 and end != 0:
-                json_str = response[start:end]
-                result = json.loads(json_str)
-                distractors = result.get("distractors", [])
+            # Ищем JSON в ответе (обрезанный ответ чинится до целых вариантов)
+            with span("json_parse"):
+                result = parse_llm_json(response, DISTRACTORS_SCHEMA)
+            if result is not None:
+                distractors = result["distractors"]
 
                 # Фильтруем, чтобы не было совпадений с правильным ответом
                 distractors = [
@@ -88,10 +383,9 @@ class LearningEngine:
                 return distractors[:3]
 
         except Exception as e:
-            print(f"[ERROR] Ошибка генерации дистракторов: {e}")
+            logger.error("Ошибка генерации дистракторов: %s", e)
 
-        # Фолбэк
-        return ["Другой персонаж", "Второстепенная роль", "Неизвестная роль"]
+        return None
 
     def create_narrative_content(self) -> Dict:
         """
@@ -101,6 +395,11 @@ class LearningEngine:
         if not self.groq_client:
             return {"error": "Groq client not available"}
 
+        # Нарратив не кэшируется между запросами: каждый запуск получает новый вариант
+        return self._memoized(("narrative",), self._request_narrative_content, shared=False)
+
+    def _request_narrative_content(self) -> Dict:
+        """Запрашивает у модели сюжет, диалог и вопросы."""
         # Подготавливаем данные для промпта
         characters = self.data.get("characters", [])[:5]
         events = self.data.get("events", [])[:5]
@@ -147,21 +446,15 @@ class LearningEngine:
         """
 
         try:
-            chat_completion = self.groq_client.chat.completions.create(
-                messages=[{"role": "user", "content": prompt}],
-                model="llama-3.3-70b-versatile",
-                temperature=0.7,
-                max_tokens=1500,
+            response = self._chat(
+                prompt, temperature=0.7, max_tokens=1500, cacheable=False
             )
 
-            response = chat_completion.choices[0].message.content
-
-            # Парсим JSON (убираем возможные markdown-обрамления)
-            import re
-
-            json_match = re.search(r"\{.*\}", response, re.DOTALL)
-            if json_match:
-                return json.loads(json_match.group())
+            # Парсим JSON (markdown-обрамления, висячие запятые, обрезанный ответ)
+            with span("json_parse"):
+                result = parse_llm_json(response, NARRATIVE_SCHEMA)
+            if result is not None:
+                return result
             else:
                 return {"error": "Could not parse JSON from response"}
 
@@ -169,51 +462,88 @@ class LearningEngine:
             return {"error": f"Groq API error: {str(e)}"}
 
     def create_all_materials(self) -> Dict[str, Any]:
-        """Создаёт ВСЕ материалы за один вызов."""
-        print("[ENGINE] Создаю все обучающие материалы...")
-
-        # === СУЩЕСТВУЮЩИЙ КОД (не меняем) ===
-        study_guide = self._create_study_guide()
-        flashcards = self._create_flashcards()
-        test = self._create_test()
-        markdown = self._export_markdown()
+        """
+        Создаёт ВСЕ материалы за один вызов.
+        Независимые этапы выполняются параллельно, поэтому время ограничено самой
+        длинной цепочкой LLM-вызовов (тест с дистракторами или анализ → нарратив).
+        """
+        return dict(self.iter_materials())
+
+    def iter_materials(self) -> Iterator[Tuple[str, Any]]:
+        """
+        Отдаёт материалы (имя, результат) по мере готовности этапов,
+        последним — "stats" со статистикой и временем этапов.
+        """
+        logger.debug("Создаю все обучающие материалы...")
+
+        start = time.perf_counter()
+        materials: Dict[str, Any] = {}
+        timings: Dict[str, float] = {}
+        stages = {
+            name: (deps, self._instrumented(name, fn))
+            for name, (deps, fn) in self._material_stages().items()
+        }
+        for name, result, elapsed in _iter_task_graph(stages):
+            materials[name] = result
+            timings[name] = round(elapsed * 1000, 1)
+            yield name, result
+        timings["total"] = round((time.perf_counter() - start) * 1000, 1)
+
         stats = {
             "total_characters": len(self.data.get("characters", [])),
             "total_events": len(self.data.get("events", [])),
-            "total_flashcards": len(flashcards),  # 'flashcards' уже создан выше
+            "total_flashcards": len(materials["flashcards"]),
             "total_questions": (
                 len(self.test_questions) if hasattr(self, "test_questions") else 0
             ),
+            "llm_calls": self.llm_calls,
+            # Время каждого этапа в миллисекундах
+            "timings": timings,
+        }
+        yield "stats", stats
+
+    def _instrumented(self, name: str, fn: Callable) -> Callable:
+        """Оборачивает этап: span и тайминги запроса в потоке пула."""
+
+        def run(results):
+            with use_timings(self.timings), span(f"stage_{name}"):
+                return fn(results)
+
+        return run
+
+    def _material_stages(self) -> Dict[str, Stage]:
+        """Граф этапов: Markdown ждёт тест, нарратив ждёт анализ типа контента."""
+        return {
+            "study_guide": ([], lambda r: self._create_study_guide()),
+            "flashcards": ([], lambda r: self._create_flashcards()),
+            "test": ([], lambda r: self._create_test()),
+            "markdown": (["test"], lambda r: self._export_markdown()),
+            "content_analysis": ([], lambda r: self.analyze_content_structure()),
+            "specialized_content": (
+                ["content_analysis"],
+                lambda r: self._create_specialized_content(r["content_analysis"]),
+            ),
         }
-        # 1. Анализируем тип контента
-        content_analysis = self.analyze_content_structure()
-        print(f"[ENGINE] Тип контента: {content_analysis.get('primary_type')}")
 
-        # 2. Создаём специализированный контент, если это NARRATIVE
+    def _create_specialized_content(self, content_analysis: Dict) -> Dict:
+        """Создаёт специализированный контент для найденного типа (пока NARRATIVE)."""
+        logger.debug("Тип контента: %s", content_analysis.get("primary_type"))
+
         specialized_content = {}
         if content_analysis.get("primary_type") == "NARRATIVE":
-            print("[ENGINE] Создаю нарративный контент...")
+            logger.debug("Создаю нарративный контент...")
             narrative_result = self.create_narrative_content()
             # Проверяем, что создание прошло без ошибок
             if isinstance(narrative_result, dict) and "error" not in narrative_result:
                 specialized_content["narrative"] = narrative_result
             else:
                 # Если ошибка, можно записать её или оставить specialized_content пустым
-                print(f"[WARNING] Не удалось создать нарратив: {narrative_result}")
-        return {
-            "study_guide": study_guide,
-            "flashcards": flashcards,
-            "test": test,
-            "markdown": markdown,
-            "stats": stats,
-            # Добавляем два новых поля в возвращаемый результат
-            "content_analysis": content_analysis,
-            "specialized_content": specialized_content,
-        }
+                logger.warning("Не удалось создать нарратив: %s", narrative_result)
+        return specialized_content
 
     def _create_study_guide(self) -> Dict:
         """Создаёт структурированный конспект."""
-        print("[ENGINE] Создаю конспект...")
+        logger.debug("Создаю конспект...")
 
         guide = {
             "title": "Конспект материала",
@@ -281,7 +611,26 @@ class LearningEngine:
         return guide
 
     def analyze_content_structure(self) -> Dict:
+        """Определяет тип контента (результат запоминается для документа)."""
+        result = None
+        if self.groq_client:
+            result = self._memoized(
+                ("content_analysis",), self._request_content_analysis
+            )
+        if result is not None:
+            return result
 
+        # Фолбэк
+        return {
+            "primary_type": "NARRATIVE",
+            "secondary_types": [],
+            "split_recommendation": "не_делить",
+            "confidence": 0.5,
+            "reason": "Фолбэк: не удалось проанализировать",
+        }
+
+    def _request_content_analysis(self) -> Optional[Dict]:
+        """Запрашивает у модели тип контента; None, если ответ не удалось разобрать."""
         prompt = f"""
         Анализируй СУЩНОСТИ, а не полный текст. Определи тип контента:
 
@@ -306,38 +655,22 @@ class LearningEngine:
         """
 
         try:
-            chat_completion = self.groq_client.chat.completions.create(
-                messages=[{"role": "user", "content": prompt}],
-                model="llama-3.3-70b-versatile",
-                temperature=0.2,
-                max_tokens=500,
-            )
-
-            response = chat_completion.choices[0].message.content
+            response = self._chat(prompt, temperature=0.2, max_tokens=500)
 
             # Ищем JSON
-            import re
-
-            json_match = re.search(r"\{.*\}", response, re.DOTALL)
-            if json_match:
-                result = json.loads(json_match.group())
+            with span("json_parse"):
+                result = parse_llm_json(response, CONTENT_ANALYSIS_SCHEMA)
+            if result is not None:
                 return result
 
         except Exception as e:
-            print(f"[ERROR] Ошибка анализа структуры: {e}")
+            logger.error("Ошибка анализа структуры: %s", e)
 
-        # Фолбэк
-        return {
-            "primary_type": "NARRATIVE",
-            "secondary_types": [],
-            "split_recommendation": "не_делить",
-            "confidence": 0.5,
-            "reason": "Фолбэк: не удалось проанализировать",
-        }
+        return None
 
     def _create_flashcards(self) -> List[Dict]:
         """Создаёт карточки для запоминания."""
-        print("[ENGINE] Создаю карточки...")
+        logger.debug("Создаю карточки...")
 
         cards = []
 
@@ -372,7 +705,7 @@ class LearningEngine:
 
     def _create_test(self) -> Dict:
         """Создаёт тест с контекстно-релевантными дистракторами."""
-        print("[ENGINE] Создаю тест с контекстными дистракторами...")
+        logger.debug("Создаю тест с контекстными дистракторами...")
 
         test = {
             "title": "Проверка знаний",
@@ -382,16 +715,26 @@ class LearningEngine:
 
         # Простые вопросы с выбором ответа
         if "characters" in self.data and len(self.data["characters"]) >= 2:
-            for i, char in enumerate(self.data["characters"][:5]):  # 5 вопросов
-                correct_role = char.get("role", "Неизвестно")
+            characters = self.data["characters"][:5]  # 5 вопросов
 
-                # Генерируем контекстно-релевантные дистракторы
-                distractors = self._generate_contextual_distractors(
-                    correct_role=correct_role,
+            # Генерируем контекстно-релевантные дистракторы параллельно:
+            # каждый вызов — отдельный запрос к Groq со своим фолбэком
+            def distractors_for(char):
+                return self._generate_contextual_distractors(
+                    correct_role=char.get("role", "Неизвестно"),
                     character_name=char.get("name", ""),
-                    context=self.raw_text,
+                    context=self._entity_context(char.get("name", "")),
+                )
+
+            workers = min(self.distractor_concurrency, len(characters))
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                all_distractors = list(
+                    pool.map(propagate_context(distractors_for), characters)
                 )
 
+            for i, (char, distractors) in enumerate(zip(characters, all_distractors)):
+                correct_role = char.get("role", "Неизвестно")
+
                 # Собираем все варианты (правильный + неправильные)
                 all_options = [correct_role] + distractors
 
@@ -453,7 +796,7 @@ class LearningEngine:
 
     def _export_markdown(self) -> str:
         """Экспортирует в Markdown."""
-        print("[ENGINE] Готовлю Markdown...")
+        logger.debug("Готовлю Markdown...")
 
         md = f"# Конспект\n\n"
         md += f"*Создано: {datetime.now().strftime('%d.%m.%Y %H:%M')}*\n\n"
@@ -580,4 +923,5 @@ def quick_test():
 
 if __name__ == "__main__":
     # Если запускаем файл напрямую - тестируем
+    logging.basicConfig(level=logging.DEBUG, format="[%(levelname)s] %(message)s")
     quick_test()
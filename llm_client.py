@@ -0,0 +1,279 @@
+"""
+LearnGame AI - Общий клиент LLM
+Обёртка над Groq с бюджетами запросов/токенов в минуту, повторами с джиттером,
+таймаутами, кэшем ответов по промпту и метриками. Повторяет интерфейс client.chat.completions.create,
+поэтому подставляется везде, где раньше использовался Groq напрямую.
+"""
+
+import collections
+import hashlib
+import random
+import threading
+import time
+from types import SimpleNamespace
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from chunking import CHARS_PER_TOKEN
+from metrics import record_llm_usage, span
+
+# Коды ответа, после которых запрос имеет смысл повторить
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+def estimate_tokens(messages: List[Dict], max_tokens: int = 0) -> int:
+    """Оценка токенов запроса: текст промпта + зарезервированный ответ."""
+    chars = sum(len(str(m.get("content", ""))) for m in messages)
+    return chars // CHARS_PER_TOKEN + max_tokens
+
+
+def _is_retryable(error: Exception) -> bool:
+    status = getattr(error, "status_code", None)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    name = type(error).__name__
+    return isinstance(error, (TimeoutError, ConnectionError)) or name in (
+        "APITimeoutError",
+        "APIConnectionError",
+    )
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """Значение заголовка Retry-After из ответа API, если оно есть."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def normalize_prompt(messages: List[Dict]) -> str:
+    """Промпт без различий в отступах и переносах строк."""
+    return "\n".join(
+        f"{m.get('role', 'user')}: {' '.join(str(m.get('content', '')).split())}"
+        for m in messages
+    )
+
+
+class PromptCache:
+    """LRU-кэш ответов модели с TTL по ключу (модель, температура, нормализованный промпт)."""
+
+    def __init__(self, max_entries: int = 2048, ttl: float = 24 * 3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: "collections.OrderedDict[str, Tuple[float, str]]" = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(model: str, temperature: float, messages: List[Dict]) -> str:
+        raw = f"{model}|{temperature}|{normalize_prompt(messages)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.time() - entry[0] > self.ttl:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: str, content: str) -> None:
+        with self._lock:
+            self._entries[key] = (time.time(), content)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+        }
+
+
+def _cached_completion(content: str) -> SimpleNamespace:
+    """Ответ из кэша в форме ChatCompletion; cached=True — модель не вызывалась."""
+    return SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+        usage=None,
+        cached=True,
+    )
+
+
+class RateLimitedClient:
+    """Клиент LLM с лимитами RPM/TPM, повторами и метриками, общий для всего приложения."""
+
+    def __init__(
+        self,
+        client,
+        rpm: int = 30,
+        tpm: int = 12000,
+        max_retries: int = 3,
+        timeout: float = 30.0,
+        backoff_base: float = 0.5,
+        backoff_max: float = 8.0,
+        prompt_cache: Optional[PromptCache] = None,
+        cache_max_temperature: float = 1.0,
+    ):
+        self.client = client
+        # Кэш ответов; запросы с температурой выше порога в него не попадают
+        self.prompt_cache = prompt_cache
+        self.cache_max_temperature = cache_max_temperature
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self._cond = threading.Condition()
+        # Окно последней минуты: (время, токены) для каждого запроса
+        self._window: Deque[Tuple[float, int]] = collections.deque()
+        self._latencies: Deque[float] = collections.deque(maxlen=500)
+        self._counters = collections.Counter()
+        self._waiting = 0
+        self._in_flight = 0
+
+        # Тот же интерфейс, что у Groq: client.chat.completions.create(...)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, messages: List[Dict], model: str, temperature: float = 0.0, max_tokens: int = 1024, cache: bool = True, **kwargs):
+        """
+        Выполняет запрос с учётом бюджетов и повторами при временных ошибках.
+        cache=False — не брать ответ из кэша и не сохранять его (творческие запросы).
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        tokens = estimate_tokens(messages, max_tokens)
+
+        cache_key = None
+        if self.prompt_cache is not None:
+            if cache and temperature <= self.cache_max_temperature:
+                cache_key = PromptCache.make_key(model, temperature, messages)
+                content = self.prompt_cache.get(cache_key)
+                if content is not None:
+                    return _cached_completion(content)
+            else:
+                self._count("cache_bypassed")
+
+        for attempt in range(self.max_retries + 1):
+            slot = self._acquire(tokens)
+            start = time.perf_counter()
+            try:
+                with span("llm_call", model=model):
+                    completion = self.client.chat.completions.create(
+                        messages=messages,
+                        model=model,
+                        temperature=temperature,
+                        max_tokens=max_tokens,
+                        **kwargs,
+                    )
+            except Exception as e:
+                self._release(slot, None)
+                self._count("errors")
+                if getattr(e, "status_code", None) == 429:
+                    self._count("rate_limited")
+                if attempt >= self.max_retries or not _is_retryable(e):
+                    raise
+                self._count("retries")
+                time.sleep(self._backoff(attempt, _retry_after(e)))
+                continue
+
+            self._latencies.append(time.perf_counter() - start)
+            usage = getattr(completion, "usage", None)
+            self._release(slot, getattr(usage, "total_tokens", None))
+            record_llm_usage(
+                getattr(usage, "prompt_tokens", None),
+                getattr(usage, "completion_tokens", None),
+            )
+            self._count("calls")
+            if cache_key is not None:
+                self.prompt_cache.set(cache_key, completion.choices[0].message.content)
+            return completion
+
+    def metrics(self) -> Dict[str, Any]:
+        """Счётчики, глубина очереди ожидания бюджета и задержки вызовов."""
+        with self._cond:
+            self._trim(time.monotonic())
+            used_requests = len(self._window)
+            used_tokens = sum(tokens for _, tokens in self._window)
+            metrics = dict(self._counters)
+            metrics.update(
+                {
+                    "queue_depth": self._waiting,
+                    "in_flight": self._in_flight,
+                    "requests_last_minute": used_requests,
+                    "tokens_last_minute": used_tokens,
+                    "rpm_limit": self.rpm,
+                    "tpm_limit": self.tpm,
+                }
+            )
+        if self.prompt_cache is not None:
+            metrics["prompt_cache"] = self.prompt_cache.stats()
+        latencies = sorted(self._latencies)
+        if latencies:
+            metrics["latency_p50_ms"] = round(latencies[len(latencies) // 2] * 1000, 1)
+            metrics["latency_p95_ms"] = round(latencies[int(len(latencies) * 0.95)] * 1000, 1)
+        return metrics
+
+    def _count(self, name: str, value: int = 1) -> None:
+        with self._cond:
+            self._counters[name] += value
+
+    def _backoff(self, attempt: int, retry_after: Optional[float]) -> float:
+        """Экспоненциальная задержка с полным джиттером (или Retry-After от сервера)."""
+        if retry_after is not None:
+            return min(retry_after, self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def _trim(self, now: float) -> None:
+        while self._window and now - self._window[0][0] >= 60:
+            self._window.popleft()
+
+    def _acquire(self, tokens: int) -> List:
+        """Ждёт, пока запрос уложится в бюджеты RPM/TPM, и резервирует их."""
+        # Запрос больше всего минутного бюджета всё равно пропускаем, когда окно пусто
+        tokens = min(tokens, self.tpm)
+        with self._cond:
+            self._waiting += 1
+            waited = time.perf_counter()
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._trim(now)
+                    used = sum(t for _, t in self._window)
+                    if len(self._window) < self.rpm and used + tokens <= self.tpm:
+                        break
+                    # Ждём, пока из окна выйдет самая старая запись
+                    self._cond.wait(max(0.01, 60 - (now - self._window[0][0])))
+            finally:
+                self._waiting -= 1
+            slot = [now, tokens]
+            self._window.append(slot)
+            self._in_flight += 1
+            self._counters["wait_ms"] += int((time.perf_counter() - waited) * 1000)
+        return slot
+
+    def _release(self, slot: List, actual_tokens: Optional[int]) -> None:
+        """Завершает запрос; фактическое число токенов заменяет оценку в окне."""
+        with self._cond:
+            self._in_flight -= 1
+            if actual_tokens is not None:
+                for i, entry in enumerate(self._window):
+                    if entry is slot:
+                        self._window[i] = (slot[0], actual_tokens)
+                        break
+            self._cond.notify_all()
@@ -0,0 +1,178 @@
+"""
+LearnGame AI - Разбор JSON из ответов модели
+Потоковый разборщик: принимает ответ кусками, пропускает markdown-обрамление
+и текст вокруг объекта, убирает висячие запятые, а обрезанный по max_tokens
+ответ закрывает на последнем целом значении. Результат проверяется по схеме вызова.
+"""
+
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+_CLOSERS = {"{": "}", "[": "]"}
+
+
+class JSONStreamParser:
+    """
+    Инкрементальный разбор первого JSON-объекта в тексте.
+    feed() можно вызывать по мере прихода токенов, partial() — в любой момент.
+    """
+
+    def __init__(self):
+        self._out: List[str] = []  # Текст объекта без висячих запятых
+        self._stack: List[str] = []
+        self._started = False
+        self._in_string = False
+        self._escape = False
+        self._after_colon = False
+        # Последняя точка, где все значения целые: (длина _out, стек скобок)
+        self._safe: Optional[Tuple[int, Tuple[str, ...]]] = None
+        self.done = False
+
+    def feed(self, chunk: str) -> None:
+        for char in chunk:
+            if self.done:
+                return
+            if not self._started:
+                if char == "{":
+                    self._started = True
+                    self._stack.append("{")
+                    self._out.append(char)
+                continue
+            self._consume(char)
+
+    def _consume(self, char: str) -> None:
+        if self._in_string:
+            self._out.append(char)
+            if self._escape:
+                self._escape = False
+            elif char == "\\":
+                self._escape = True
+            elif char == '"':
+                self._in_string = False
+                # Закрытая строка-значение (не ключ) — целое значение
+                if self._after_colon or self._stack[-1] == "[":
+                    self._after_colon = False
+                    self._mark_safe()
+            return
+
+        if char == '"':
+            self._in_string = True
+        elif char in "{[":
+            self._after_colon = False
+            self._stack.append(char)
+        elif char in "}]":
+            self._drop_trailing_comma()
+            if not self._stack or _CLOSERS[self._stack[-1]] != char:
+                # Несогласованная скобка: оставляем то, что уже разобрано
+                self.done = True
+                return
+            self._stack.pop()
+            self._out.append(char)
+            self._after_colon = False
+            if not self._stack:
+                self.done = True
+            else:
+                self._mark_safe()
+            return
+        elif char == ",":
+            self._after_colon = False
+            self._mark_safe()
+        elif char == ":":
+            self._after_colon = True
+        self._out.append(char)
+
+    def _drop_trailing_comma(self) -> None:
+        i = len(self._out) - 1
+        while i >= 0 and self._out[i].isspace():
+            i -= 1
+        if i >= 0 and self._out[i] == ",":
+            del self._out[i]
+
+    def _mark_safe(self) -> None:
+        self._safe = (len(self._out), tuple(self._stack))
+
+    def text(self) -> Optional[str]:
+        """Текст объекта: целиком или обрезанный до последнего целого значения и закрытый."""
+        if not self._started:
+            return None
+        if self.done and not self._stack:
+            return "".join(self._out)
+        if self._safe is None:
+            # Ни одного целого значения — пустой объект
+            return "{}"
+        end, stack = self._safe
+        return "".join(self._out[:end]) + "".join(_CLOSERS[c] for c in reversed(stack))
+
+    def partial(self) -> Optional[Any]:
+        """Лучшее на данный момент значение или None, если разобрать нечего."""
+        text = self.text()
+        if text is None:
+            return None
+        try:
+            return json.loads(text)
+        except ValueError:
+            return None
+
+
+def parse_llm_json(response: str, schema: Any = None) -> Optional[Any]:
+    """
+    Извлекает JSON-объект из ответа модели (с починкой, где это безопасно).
+    None, если объект не найден или не соответствует схеме.
+    """
+    parser = JSONStreamParser()
+    parser.feed(response or "")
+    result = parser.partial()
+    if result is None or (schema is not None and not matches_schema(result, schema)):
+        return None
+    return result
+
+
+def matches_schema(value: Any, schema: Any) -> bool:
+    """
+    Проверка по упрощённой схеме: тип (или кортеж типов), [схема элемента списка]
+    или {ключ: схема}; ключ с "?" на конце необязателен, лишние ключи допустимы.
+    """
+    if isinstance(schema, dict):
+        if not isinstance(value, dict):
+            return False
+        for key, sub in schema.items():
+            optional = key.endswith("?")
+            key = key.rstrip("?")
+            if key not in value:
+                if optional:
+                    continue
+                return False
+            if not matches_schema(value[key], sub):
+                return False
+        return True
+    if isinstance(schema, list):
+        return isinstance(value, list) and all(matches_schema(v, schema[0]) for v in value)
+    if schema is float:
+        schema = (int, float)
+    return isinstance(value, schema) and not (schema is int and isinstance(value, bool))
+
+
+# Схемы ответов по вызовам
+ENTITIES_SCHEMA: Dict[str, Any] = {
+    "characters?": [dict],
+    "locations?": [dict],
+    "events?": [dict],
+    "objects?": [dict],
+}
+DISTRACTORS_SCHEMA: Dict[str, Any] = {"distractors": [str]}
+CONTENT_ANALYSIS_SCHEMA: Dict[str, Any] = {
+    "primary_type": str,
+    "confidence?": float,
+    "reason?": str,
+}
+NARRATIVE_SCHEMA: Dict[str, Any] = {
+    "story": str,
+    "dialog?": dict,
+    "interactive_questions": [{"question": str, "options": [str], "correct?": int}],
+}
+COMBINED_SCHEMA: Dict[str, Any] = {
+    **ENTITIES_SCHEMA,
+    "content_analysis?": dict,
+    "distractors?": dict,
+    "narrative?": dict,
+}
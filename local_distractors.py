@@ -0,0 +1,133 @@
+"""
+LearnGame AI - Локальный генератор дистракторов
+Неправильные варианты ответа без LLM: роли других персонажей документа и словарь
+ролей из ранее проиндексированных документов, ранжированные по сходству
+символьных n-грамм с правильной ролью (правдоподобно, но не то же самое).
+"""
+
+import heapq
+from typing import Dict, Iterable, List, Set
+
+from chunking import normalize_name
+
+NGRAM = 3
+# Слишком похожие варианты — фактически та же роль ("бог войны" / "бог войны ареса")
+MAX_SIMILARITY = 0.75
+# Роли из самого документа правдоподобнее словарных
+DOCUMENT_BONUS = 0.15
+# Сколько словарных ролей оценивать на вопрос: кандидаты берутся по самым редким n-граммам
+MAX_CANDIDATES = 64
+
+
+def char_ngrams(text: str, n: int = NGRAM) -> Set[str]:
+    """Символьные n-граммы нормализованного текста с границами слов."""
+    text = f" {normalize_name(text)} "
+    if len(text) <= n:
+        return {text}
+    return {text[i : i + n] for i in range(len(text) - n + 1)}
+
+
+def _same_meaning(a: str, b: str) -> bool:
+    """Одна роль уточняет другую: все слова одной входят в другую ("бог войны" / "грозный бог войны")."""
+    words_a, words_b = set(a.split()), set(b.split())
+    return words_a <= words_b or words_b <= words_a
+
+
+def similarity(a: Set[str], b: Set[str]) -> float:
+    """Коэффициент Дайса по множествам n-грамм."""
+    if not a or not b:
+        return 0.0
+    return 2 * len(a & b) / (len(a) + len(b))
+
+
+class LocalDistractorGenerator:
+    """
+    Подбирает дистракторы из пула ролей документа и словаря ролей.
+    Словарь (по убыванию частоты) индексируется один раз — инвертированный индекс
+    n-грамм, поэтому запрос стоит доли миллисекунды даже на тысячах ролей.
+    """
+
+    def __init__(self, vocabulary: Iterable[str] = ()):
+        self._roles: List[str] = []
+        self._keys: List[str] = []
+        self._grams: List[Set[str]] = []
+        self._postings: Dict[str, List[int]] = {}
+        self._known: Set[str] = set()
+        for role in vocabulary:
+            self._add(role)
+
+    def _add(self, role: str) -> None:
+        role = str(role or "").strip()
+        key = normalize_name(role)
+        if not key or key in self._known:
+            return
+        self._known.add(key)
+        grams = char_ngrams(role)
+        index = len(self._roles)
+        self._roles.append(role)
+        self._keys.append(key)
+        self._grams.append(grams)
+        for gram in grams:
+            self._postings.setdefault(gram, []).append(index)
+
+    def _candidates(self, target: Set[str]) -> Set[int]:
+        """Словарные роли с общими n-граммами, начиная с самых редких (информативных)."""
+        postings = sorted(
+            (self._postings[gram] for gram in target if gram in self._postings), key=len
+        )
+        candidates: Set[int] = set()
+        for posting in postings:
+            if candidates and len(candidates) + len(posting) > MAX_CANDIDATES:
+                break
+            # Списки в порядке словаря, т.е. от частых ролей к редким
+            candidates.update(posting[:MAX_CANDIDATES])
+        return candidates
+
+    def distractors(self, correct_role: str, pool: Iterable[str] = (), count: int = 3) -> List[str]:
+        """
+        До count неправильных вариантов для correct_role.
+        pool — роли других персонажей документа (в приоритете при равном сходстве).
+        """
+        correct_key = normalize_name(correct_role)
+        target = char_ngrams(correct_role)
+
+        # key -> (оценка, роль, n-граммы)
+        scored: Dict[str, tuple] = {}
+        for role in pool:
+            key = normalize_name(role)
+            if key and key != correct_key and key not in scored:
+                grams = char_ngrams(role)
+                scored[key] = (similarity(target, grams) + DOCUMENT_BONUS, str(role).strip(), grams)
+
+        for index in self._candidates(target):
+            key = self._keys[index]
+            if key == correct_key or key in scored:
+                continue
+            grams = self._grams[index]
+            scored[key] = (similarity(target, grams), self._roles[index], grams)
+
+        chosen: List[str] = []
+        taken: List[tuple] = [(correct_key, target)]
+
+        def take(key: str, role: str, grams: Set[str]) -> None:
+            # Почти совпадает с правильным ответом или с уже выбранным вариантом
+            for other_key, other_grams in taken:
+                if _same_meaning(key, other_key) or similarity(grams, other_grams) > MAX_SIMILARITY:
+                    return
+            chosen.append(role)
+            taken.append((key, grams))
+
+        best = heapq.nsmallest(
+            count * 10, scored.items(), key=lambda item: (-item[1][0], item[0])
+        )
+        for key, (_, role, grams) in best:
+            if len(chosen) == count:
+                break
+            take(key, role, grams)
+
+        # Мало похожих вариантов — добираем самыми частыми ролями словаря
+        for role, key, grams in zip(self._roles, self._keys, self._grams):
+            if len(chosen) >= count:
+                break
+            take(key, role, grams)
+        return chosen
@@ -0,0 +1,182 @@
+"""
+LearnGame AI - Метрики и тайминги конвейера
+Гистограммы в формате Prometheus (/metrics) и сбор таймингов одного запроса
+через span(): извлечение PDF, вызовы LLM, разбор JSON, этапы движка.
+"""
+
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    pairs = []
+    for key, value in sorted(labels.items()):
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{key}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+class Histogram:
+    """Гистограмма Prometheus с произвольными метками."""
+
+    def __init__(self, name: str, help: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self._series: Dict[Tuple, List] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._series.items()):
+                labels = dict(key)
+                for bound, bucket_count in zip(self.buckets, counts):
+                    lines.append(
+                        f"{self.name}_bucket{_format_labels({**labels, 'le': bound})} {bucket_count}"
+                    )
+                lines.append(f"{self.name}_bucket{_format_labels({**labels, 'le': '+Inf'})} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(labels)} {total:.6f}")
+                lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+        return lines
+
+
+class Counter:
+    """Монотонный счётчик Prometheus с метками."""
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(dict(key))} {value:g}")
+        return lines
+
+
+SPAN_SECONDS = Histogram(
+    "learngame_span_seconds", "Длительность шагов конвейера (pdf, llm, json, этапы движка)"
+)
+LLM_TOKENS = Counter("learngame_llm_tokens_total", "Токены LLM по типу (prompt/completion)")
+REGISTRY = [SPAN_SECONDS, LLM_TOKENS]
+
+
+def render_prometheus(gauges: Iterable[Tuple[str, str, Dict[str, str], float]] = ()) -> str:
+    """Текст для /metrics; gauges — (имя, описание, метки, значение) текущих показателей."""
+    lines: List[str] = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    described = set()
+    for name, help, labels, value in gauges:
+        if name not in described:
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} gauge")
+            described.add(name)
+        lines.append(f"{name}{_format_labels(labels)} {value:g}")
+    return "\n".join(lines) + "\n"
+
+
+class Timings:
+    """Тайминги одного запроса, агрегированные по имени шага."""
+
+    def __init__(self):
+        self._spans: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, name: str, seconds: Optional[float] = None, **values: float) -> None:
+        """Добавляет длительность шага (если есть) и произвольные суммируемые значения."""
+        with self._lock:
+            entry = self._spans.setdefault(name, {"count": 0, "total_ms": 0.0})
+            if seconds is not None:
+                entry["count"] += 1
+                entry["total_ms"] += seconds * 1000
+            for key, value in values.items():
+                entry[key] = entry.get(key, 0) + value
+
+    def as_dict(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {
+                name: {key: round(value, 1) for key, value in entry.items()}
+                for name, entry in self._spans.items()
+            }
+
+
+_current_timings: contextvars.ContextVar[Optional[Timings]] = contextvars.ContextVar(
+    "learngame_timings", default=None
+)
+
+
+@contextmanager
+def use_timings(timings: Optional[Timings]):
+    """Направляет span() текущего потока в сборщик таймингов запроса."""
+    if timings is None:
+        yield
+        return
+    token = _current_timings.set(timings)
+    try:
+        yield
+    finally:
+        _current_timings.reset(token)
+
+
+def propagate_context(fn: Callable) -> Callable:
+    """Переносит контекст (сборщик таймингов) в потоки ThreadPoolExecutor."""
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.copy().run(fn, *args, **kwargs)
+
+
+@contextmanager
+def span(name: str, **labels: str):
+    """Замеряет шаг: пишет в гистограмму и в тайминги текущего запроса."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        SPAN_SECONDS.observe(elapsed, span=name, **labels)
+        timings = _current_timings.get()
+        if timings is not None:
+            timings.add(name, elapsed)
+
+
+def record_llm_usage(prompt_tokens: Optional[int], completion_tokens: Optional[int]) -> None:
+    """Учитывает токены ответа LLM в счётчиках и таймингах запроса."""
+    if prompt_tokens is None and completion_tokens is None:
+        return
+    LLM_TOKENS.inc(prompt_tokens or 0, kind="prompt")
+    LLM_TOKENS.inc(completion_tokens or 0, kind="completion")
+    timings = _current_timings.get()
+    if timings is not None:
+        timings.add(
+            "llm_call",
+            prompt_tokens=prompt_tokens or 0,
+            completion_tokens=completion_tokens or 0,
+        )
@@ -0,0 +1,246 @@
+"""
+LearnGame AI - Извлечение текста из PDF
+Страницы читаются потоково и чтение прекращается, как только набран нужный
+объём текста; большие документы можно разбирать диапазонами страниц в пуле процессов.
+Бэкенды: "pdfium" (pypdfium2, быстрый, только текст) и "pdfplumber" (точнее на
+таблицах и сложной вёрстке); "auto" пробует pdfium и переходит на pdfplumber,
+если на первых страницах мало осмысленного текста.
+"""
+
+import multiprocessing
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Iterator, List
+
+import pdfplumber
+
+try:
+    import pypdfium2
+except ImportError:  # без pypdfium2 "auto" сразу использует pdfplumber
+    pypdfium2 = None
+
+# "auto": сколько первых страниц проверять и какой текст считать плохим
+SAMPLE_PAGES = 3
+MIN_CHARS_PER_PAGE = 200
+MAX_BAD_CHAR_RATIO = 0.05
+
+
+class PdfplumberBackend:
+    """pdfplumber: раскладка с учётом позиций символов, медленнее."""
+
+    name = "pdfplumber"
+
+    def iter_pages(self, pdf_path: str, start: int = 0, stop: int = None) -> Iterator[str]:
+        """Отдаёт текст страниц [start, stop) по одной, освобождая кэш каждой страницы."""
+        with pdfplumber.open(pdf_path) as pdf:
+            for page in pdf.pages[start:stop]:
+                page_text = page.extract_text()
+                page.close()
+                yield page_text or ""
+
+    def count_pages(self, pdf_path: str) -> int:
+        with pdfplumber.open(pdf_path) as pdf:
+            return len(pdf.pages)
+
+
+class PdfiumBackend:
+    """pypdfium2 (PDFium): текстовый слой страницы без анализа раскладки, в разы быстрее."""
+
+    name = "pdfium"
+    # PDFium не потокобезопасен: вызовы из разных потоков процесса выполняются по очереди
+    _lock = threading.Lock()
+
+    def iter_pages(self, pdf_path: str, start: int = 0, stop: int = None) -> Iterator[str]:
+        with self._lock:
+            pdf = pypdfium2.PdfDocument(pdf_path)
+        try:
+            total = len(pdf)
+            for index in range(start, total if stop is None else min(stop, total)):
+                # Блокировка на страницу: другие потоки читают свои документы между страницами
+                with self._lock:
+                    page = pdf[index]
+                    textpage = page.get_textpage()
+                    page_text = textpage.get_text_bounded()
+                    textpage.close()
+                    page.close()
+                yield page_text.replace("\r\n", "\n")
+        finally:
+            with self._lock:
+                pdf.close()
+
+    def count_pages(self, pdf_path: str) -> int:
+        with self._lock:
+            pdf = pypdfium2.PdfDocument(pdf_path)
+            try:
+                return len(pdf)
+            finally:
+                pdf.close()
+
+
+BACKENDS: Dict[str, object] = {"pdfplumber": PdfplumberBackend()}
+if pypdfium2 is not None:
+    BACKENDS["pdfium"] = PdfiumBackend()
+
+
+def _looks_extracted(pages: List[str]) -> bool:
+    """Достаточно ли текста и мало ли в нём мусора (нераспознанные глифы, управляющие символы)."""
+    text = "".join(pages)
+    if not pages or len(text) < MIN_CHARS_PER_PAGE * len(pages):
+        return False
+    bad = sum(1 for char in text if char == "\ufffd" or (char < " " and char not in "\n\t"))
+    return bad <= len(text) * MAX_BAD_CHAR_RATIO
+
+
+def choose_backend(pdf_path: str, backend: str = "auto") -> str:
+    """
+    Бэкенд для документа. "auto": pdfium, если он установлен и первые SAMPLE_PAGES
+    страниц дают плотный чистый текст, иначе pdfplumber.
+    """
+    if backend != "auto":
+        if backend not in BACKENDS:
+            raise ValueError(f"Неизвестный бэкенд PDF: {backend}")
+        return backend
+    if "pdfium" not in BACKENDS:
+        return "pdfplumber"
+    try:
+        sample = []
+        for page_text in BACKENDS["pdfium"].iter_pages(pdf_path, 0, SAMPLE_PAGES):
+            sample.append(page_text)
+    except Exception:
+        return "pdfplumber"
+    return "pdfium" if _looks_extracted(sample) else "pdfplumber"
+
+
+def iter_pdf_pages(
+    pdf_path: str, start: int = 0, stop: int = None, backend: str = "pdfplumber"
+) -> Iterator[str]:
+    """Отдаёт непустой текст страниц [start, stop) по одной."""
+    for page_text in BACKENDS[backend].iter_pages(pdf_path, start, stop):
+        if page_text.strip():
+            yield page_text
+
+
+def count_pages(pdf_path: str, backend: str = "pdfplumber") -> int:
+    """Количество страниц в документе."""
+    return BACKENDS[backend].count_pages(pdf_path)
+
+
+def _extract_page_range(pdf_path: str, start: int, stop: int, backend: str) -> List[str]:
+    return list(iter_pdf_pages(pdf_path, start, stop, backend))
+
+
+def extract_text_from_pdf(
+    pdf_path: str,
+    max_chars: int = 10000,
+    workers: int = 1,
+    pages_per_task: int = 16,
+    parallel_min_pages: int = 64,
+    backend: str = "auto",
+) -> str:
+    """
+    Извлекает текст из PDF файла (не больше max_chars символов).
+    При workers > 1 документы от parallel_min_pages страниц разбираются
+    диапазонами по pages_per_task страниц в пуле процессов.
+    backend — "auto", "pdfium" или "pdfplumber" (см. choose_backend).
+    """
+    backend = choose_backend(pdf_path, backend)
+    if workers > 1:
+        total_pages = count_pages(pdf_path, backend)
+        if total_pages >= parallel_min_pages:
+            return _extract_parallel(
+                pdf_path, max_chars, workers, pages_per_task, total_pages, backend
+            )
+
+    parts: List[str] = []
+    size = 0
+    for page_text in iter_pdf_pages(pdf_path, backend=backend):
+        parts.append(page_text + "\n")
+        size += len(page_text) + 1
+        if size >= max_chars:
+            break
+    return "".join(parts)[:max_chars]
+
+
+# Пулы процессов для разбора диапазонов страниц: живут всё время работы процесса
+# (по одному на число воркеров). Дочерние процессы запускаются через spawn: fork из
+# многопоточного воркера может унаследовать захваченную блокировку (PdfiumBackend._lock,
+# внутреннее состояние PDFium) и зависнуть
+_pools: Dict[int, ProcessPoolExecutor] = {}
+_pools_lock = threading.Lock()
+
+
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    with _pools_lock:
+        pool = _pools.get(workers)
+        if pool is None:
+            pool = ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+            )
+            _pools[workers] = pool
+        return pool
+
+
+def _discard_pool(workers: int, pool: ProcessPoolExecutor) -> None:
+    """Убирает сломанный пул (упал дочерний процесс): следующий документ создаст новый."""
+    with _pools_lock:
+        if _pools.get(workers) is pool:
+            del _pools[workers]
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def shutdown_pools() -> None:
+    """Останавливает пулы процессов (при остановке приложения)."""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def _extract_parallel(
+    pdf_path: str,
+    max_chars: int,
+    workers: int,
+    pages_per_task: int,
+    total_pages: int,
+    backend: str,
+) -> str:
+    """Параллельный разбор диапазонов страниц с сохранением порядка и ранней остановкой."""
+    ranges = iter(
+        (start, min(start + pages_per_task, total_pages))
+        for start in range(0, total_pages, pages_per_task)
+    )
+    parts: List[str] = []
+    size = 0
+
+    pool = _get_pool(workers)
+    # В полёте не больше 2 диапазонов на процесс: дальше читать может не понадобиться
+    in_flight = deque()
+    try:
+        for start, stop in ranges:
+            in_flight.append(pool.submit(_extract_page_range, pdf_path, start, stop, backend))
+            if len(in_flight) >= workers * 2:
+                break
+
+        while in_flight:
+            for page_text in in_flight.popleft().result():
+                parts.append(page_text + "\n")
+                size += len(page_text) + 1
+            if size >= max_chars:
+                break
+            next_range = next(ranges, None)
+            if next_range:
+                in_flight.append(
+                    pool.submit(_extract_page_range, pdf_path, *next_range, backend)
+                )
+    except BrokenProcessPool:
+        _discard_pool(workers, pool)
+        raise
+    finally:
+        # Пул общий: ненужные больше диапазоны этого документа снимаем с очереди
+        for future in in_flight:
+            future.cancel()
+
+    return "".join(parts)[:max_chars]
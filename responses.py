@@ -0,0 +1,183 @@
+"""
+LearnGame AI - Сжатые и кэшируемые HTTP-ответы
+Быстрая сериализация JSON (orjson), сжатие gzip/brotli по Accept-Encoding
+(в том числе потоков SSE — с досылкой каждого события) и ETag для условных GET.
+"""
+
+import hashlib
+import zlib
+from typing import Any, Dict, Optional
+
+import orjson
+from fastapi import Request
+from fastapi.responses import JSONResponse, Response
+
+try:
+    import brotli
+except ImportError:  # brotli необязателен: без него клиенты получают gzip
+    brotli = None
+
+# Ответы меньше этого размера не сжимаются: выигрыш меньше накладных расходов
+MINIMUM_SIZE = 500
+GZIP_LEVEL = 6
+# Качество 4–5 сжимает JSON лучше gzip -6 при сопоставимой скорости
+BROTLI_QUALITY = 4
+
+
+def dumps(value: Any) -> bytes:
+    """JSON в UTF-8 (без \\u-экранирования кириллицы)."""
+    return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse с сериализацией через orjson."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Слабое сравнение: сжатые ответы отдаются со слабым ETag (W/"...")."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return etag.removeprefix("W/") in tags
+
+
+def etag_response(
+    request: Request, body: bytes, media_type: str, headers: Optional[Dict[str, str]] = None
+) -> Response:
+    """Ответ с ETag по содержимому; 304 без тела, если у клиента та же версия."""
+    etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache", **(headers or {})}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type=media_type, headers=headers)
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """"br" или "gzip" по заголовку Accept-Encoding (с учётом q=0), иначе None."""
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    if brotli is not None and accepted.get("br", 0) > 0:
+        return "br"
+    if accepted.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+
+class _Compressor:
+    def __init__(self, encoding: str):
+        if encoding == "br":
+            self._br = brotli.Compressor(quality=BROTLI_QUALITY)
+            self._gz = None
+        else:
+            self._br = None
+            self._gz = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes, flush: bool = False) -> bytes:
+        """Сжимает кусок; flush — отдать всё накопленное (событие потока не должно застревать)."""
+        if self._br is not None:
+            out = self._br.process(data)
+            return out + self._br.flush() if flush else out
+        out = self._gz.compress(data)
+        return out + self._gz.flush(zlib.Z_SYNC_FLUSH) if flush else out
+
+    def finish(self, data: bytes = b"") -> bytes:
+        if self._br is not None:
+            return self._br.process(data) + self._br.finish()
+        return self._gz.compress(data) + self._gz.flush()
+
+
+class CompressionMiddleware:
+    """
+    ASGI-middleware: сжимает ответы gzip или brotli.
+    Не трогает маленькие и уже сжатые ответы, 204/206/304; потоковые ответы
+    сжимаются по кускам с досылкой, чтобы события SSE приходили без задержки.
+    """
+
+    def __init__(self, app, minimum_size: int = MINIMUM_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope.get("headers") or [])
+        encoding = choose_encoding(headers.get(b"accept-encoding", b"").decode("latin-1"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        compressor: Optional[_Compressor] = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start_message, compressor, passthrough
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+            if passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if compressor is None:
+                response_headers = dict(start_message.get("headers") or [])
+                if (
+                    b"content-encoding" in response_headers
+                    or start_message["status"] in (204, 206, 304)
+                    or (not more_body and len(body) < self.minimum_size)
+                ):
+                    passthrough = True
+                    await send(start_message)
+                    await send(message)
+                    return
+                compressor = _Compressor(encoding)
+                if not more_body:
+                    body = compressor.finish(body)
+                    await send(self._start(start_message, encoding, len(body)))
+                    await send({"type": "http.response.body", "body": body})
+                    return
+                await send(self._start(start_message, encoding, None))
+
+            if more_body:
+                body = compressor.compress(body, flush=True)
+            else:
+                body = compressor.finish(body)
+            await send({"type": "http.response.body", "body": body, "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
+
+    @staticmethod
+    def _start(message, encoding: str, length: Optional[int]):
+        headers = []
+        for name, value in message.get("headers") or []:
+            if name == b"content-length":
+                continue
+            if name == b"etag" and not value.startswith(b"W/"):
+                # Сжатое тело отличается побайтно — ETag становится слабым
+                value = b"W/" + value
+            headers.append((name, value))
+        headers.append((b"content-encoding", encoding.encode("latin-1")))
+        headers.append((b"vary", b"Accept-Encoding"))
+        if length is not None:
+            headers.append((b"content-length", str(length).encode("latin-1")))
+        return {**message, "headers": headers}
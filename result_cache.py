@@ -0,0 +1,138 @@
+"""
+LearnGame AI - Кэш результатов обработки
+Хранит готовые материалы по SHA-256 загруженного PDF, чтобы повторные загрузки
+одного и того же учебника не требовали ни одного вызова LLM.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+
+class ResultCache:
+    """Персистентный кэш на SQLite с вытеснением по размеру (LRU)."""
+
+    def __init__(self, path: str = "cache/results.sqlite3", max_bytes: int = 512 * 1024 * 1024):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # Базу делят процессы-воркеры: WAL и ожидание чужой записи вместо "database is locked"
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS results (
+                key TEXT PRIMARY KEY,
+                doc_hash TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_results_doc_hash ON results(doc_hash);
+            CREATE INDEX IF NOT EXISTS idx_results_last_access ON results(last_access);
+            """
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(doc_hash: str, version: str) -> str:
+        """Ключ = SHA-256 содержимого файла + версия промптов/модели."""
+        return f"{doc_hash}:{version}"
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Возвращает сохранённый результат или None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload FROM results WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute(
+                "UPDATE results SET last_access = ? WHERE key = ?", (time.time(), key)
+            )
+            self._conn.commit()
+        return json.loads(row[0])
+
+    def get_fields(self, key: str, paths: List[str]) -> Optional[List[str]]:
+        """
+        Отдельные поля сохранённого результата как JSON-текст (пути JSON1: "$.all_materials.test"),
+        без разбора всего результата. Отсутствующее поле — "null". None, если записи нет.
+        Обращение продлевает жизнь записи, но не учитывается в hits/misses.
+        """
+        columns = ", ".join("json_quote(json_extract(payload, ?))" for _ in paths)
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {columns} FROM results WHERE key = ?", (*paths, key)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE results SET last_access = ? WHERE key = ?", (time.time(), key)
+            )
+            self._conn.commit()
+        return list(row)
+
+    def set(self, key: str, payload: Dict[str, Any]) -> None:
+        """Сохраняет результат и при необходимости вытесняет старые записи."""
+        data = json.dumps(payload, ensure_ascii=False)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?)",
+                (key, key.split(":", 1)[0], data, len(data.encode("utf-8")), now, now),
+            )
+            self._evict()
+            self._conn.commit()
+
+    def invalidate(self, doc_hash: Optional[str] = None) -> int:
+        """Удаляет записи документа (все версии) или весь кэш. Возвращает число удалённых."""
+        with self._lock:
+            if doc_hash:
+                cursor = self._conn.execute(
+                    "DELETE FROM results WHERE doc_hash = ?", (doc_hash,)
+                )
+            else:
+                cursor = self._conn.execute("DELETE FROM results")
+            self._conn.commit()
+        return cursor.rowcount
+
+    def stats(self) -> Dict[str, Any]:
+        """Счётчики попаданий/промахов и текущий размер кэша."""
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results"
+            ).fetchone()
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "entries": entries,
+            "size_bytes": size,
+            "max_bytes": self.max_bytes,
+        }
+
+    def _evict(self) -> None:
+        """Удаляет давно не использованные записи, пока кэш не уложится в лимит."""
+        (size,) = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM results"
+        ).fetchone()
+        if size <= self.max_bytes:
+            return
+        rows = self._conn.execute(
+            "SELECT key, size FROM results ORDER BY last_access ASC"
+        ).fetchall()
+        for key, entry_size in rows:
+            if size <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM results WHERE key = ?", (key,))
+            size -= entry_size
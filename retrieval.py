@@ -0,0 +1,109 @@
+"""
+LearnGame AI - Поиск фрагментов текста для промптов
+Полный извлечённый текст режется на фрагменты по границам предложений,
+фрагменты индексируются BM25, и в промпт о сущности попадают только те,
+что упоминают её, в пределах бюджета токенов.
+"""
+
+import heapq
+import math
+import re
+from collections import Counter
+from typing import Dict, List, Tuple
+
+from chunking import CHARS_PER_TOKEN
+
+# Размер фрагмента и бюджет контекста одного промпта, в токенах
+PASSAGE_TOKENS = 80
+CONTEXT_TOKENS = 300
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+_SENTENCE_END = re.compile(r"(?<=[.!?…])\s+")
+# Частые окончания: "Геракла", "Гераклу", "Гераклом" находят фрагменты про "Геракл"
+_ENDINGS = re.compile(
+    r"(ами|ями|ого|его|ому|ему|ыми|ими|ом|ем|ой|ей|ов|ев|ам|ям|ах|ях|ую|юю|ая|яя|ое|ее|ые|ие|"
+    r"ый|ий|а|я|у|ю|е|и|ы|ь)$"
+)
+
+
+def stem(word: str) -> str:
+    """Грубая основа слова: без частых падежных окончаний, если остаётся хотя бы 3 буквы."""
+    stemmed = _ENDINGS.sub("", word)
+    return stemmed if len(stemmed) >= 3 else word
+
+
+def tokenize(text: str) -> List[str]:
+    return [stem(word) for word in re.findall(r"\w+", text.casefold().replace("ё", "е"))]
+
+
+def split_passages(text: str, token_budget: int = PASSAGE_TOKENS) -> List[str]:
+    """Фрагменты до token_budget токенов из целых предложений одного абзаца."""
+    limit = token_budget * CHARS_PER_TOKEN
+    passages: List[str] = []
+    for paragraph in re.split(r"\n\s*\n", text):
+        current = ""
+        for sentence in _SENTENCE_END.split(" ".join(paragraph.split())):
+            if not sentence:
+                continue
+            if current and len(current) + len(sentence) + 1 > limit:
+                passages.append(current)
+                current = ""
+            current = f"{current} {sentence}" if current else sentence
+            # Предложение длиннее фрагмента режем жёстко
+            while len(current) > limit:
+                passages.append(current[:limit])
+                current = current[limit:]
+        if current:
+            passages.append(current)
+    return passages
+
+
+class PassageIndex:
+    """BM25 по фрагментам одного документа."""
+
+    def __init__(self, text: str, passage_tokens: int = PASSAGE_TOKENS):
+        self.passages = split_passages(text, passage_tokens)
+        self._postings: Dict[str, List[Tuple[int, int]]] = {}
+        self._lengths: List[int] = []
+        for index, passage in enumerate(self.passages):
+            terms = tokenize(passage)
+            self._lengths.append(len(terms))
+            for term, count in Counter(terms).items():
+                self._postings.setdefault(term, []).append((index, count))
+        self._average_length = sum(self._lengths) / len(self._lengths) if self._lengths else 0.0
+
+    def search(self, query: str, limit: int = 10) -> List[Tuple[float, int]]:
+        """До limit лучших фрагментов: (оценка BM25, номер фрагмента)."""
+        total = len(self.passages)
+        scores: Dict[int, float] = {}
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+            for index, count in postings:
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self._lengths[index] / self._average_length)
+                score = idf * count * (BM25_K1 + 1) / (count + norm)
+                scores[index] = scores.get(index, 0.0) + score
+        return heapq.nlargest(limit, ((score, index) for index, score in scores.items()))
+
+    def context(self, query: str, token_budget: int = CONTEXT_TOKENS) -> str:
+        """
+        Самые релевантные запросу фрагменты в пределах token_budget, в порядке текста.
+        Пустая строка, если ни один фрагмент не подходит.
+        """
+        budget = token_budget * CHARS_PER_TOKEN
+        chosen: List[int] = []
+        seen = set()
+        size = 0
+        for _, index in self.search(query, limit=50):
+            passage = self.passages[index]
+            length = len(passage) + 1
+            # Повторы (колонтитулы, одинаковые абзацы) только тратят бюджет
+            if passage in seen or size + length > budget:
+                continue
+            seen.add(passage)
+            chosen.append(index)
+            size += length
+        return "\n".join(self.passages[index] for index in sorted(chosen))
@@ -1,5 +1,61 @@
+"""
+Запуск LearnGame AI.
+
+    python run.py                  # разработка: один процесс с перезагрузкой
+    python run.py --workers 8      # продакшен: 8 процессов (0 = по числу ядер)
+
+В продакшен-режиме процессы делят кэш результатов, индекс сущностей и очередь
+задач (SQLite в cache/), а бюджет запросов к Groq — поровну, поэтому процессов
+не может быть больше LEARNGAME_LLM_RPM. Кэш промптов LLM и мемо движка у каждого
+процесса свои: повторный запрос попадает в них, только если придёт в тот же
+процесс. При остановке (SIGTERM/Ctrl+C) новые соединения не принимаются,
+текущие загрузки и задачи дорабатывают до LEARNGAME_JOB_DRAIN_SECONDS.
+"""
+
+import argparse
+import logging
+import os
+from pathlib import Path
+
 import uvicorn
 
 if __name__ == "__main__":
-    uvicorn.run("app:app", host="0.0.0.0", port=8000, reload=True)
-    
+    parser = argparse.ArgumentParser(description="LearnGame AI")
+    parser.add_argument("--host", default=os.environ.get("LEARNGAME_HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("LEARNGAME_PORT", "8000")))
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help=(
+            "число процессов (не больше LEARNGAME_LLM_RPM); без флага — режим "
+            "разработки с перезагрузкой. Кэш промптов и мемо движка у каждого "
+            "процесса свои"
+        ),
+    )
+    args = parser.parse_args()
+
+    frontend = Path(__file__).parent.parent / "frontend"
+    if not frontend.is_dir():
+        logging.warning("Папка frontend не найдена: %s", frontend)
+
+    if args.workers is None:
+        # Фронтенд раздаётся из памяти — в разработке перечитываем его при изменениях
+        os.environ.setdefault("LEARNGAME_STATIC_RELOAD", "1")
+        uvicorn.run("app:app", host=args.host, port=args.port, reload=True)
+    else:
+        workers = args.workers or os.cpu_count() or 1
+        # Бюджет ключа делится поровну: каждому процессу нужен хотя бы запрос в минуту
+        rpm = int(os.environ.get("LEARNGAME_LLM_RPM", "30"))
+        if workers > rpm:
+            parser.error(f"--workers {workers} больше LEARNGAME_LLM_RPM={rpm}")
+        # Воркеры наследуют окружение: по нему app.py делит бюджеты LLM
+        os.environ["LEARNGAME_WEB_WORKERS"] = str(workers)
+        drain = float(os.environ.get("LEARNGAME_JOB_DRAIN_SECONDS", "30"))
+        uvicorn.run(
+            "app:app",
+            host=args.host,
+            port=args.port,
+            workers=workers,
+            timeout_graceful_shutdown=drain,
+        )
@@ -0,0 +1,174 @@
+"""
+LearnGame AI - Интервальное повторение карточек (SM-2)
+Состояние каждой карточки каждого пользователя хранится в SQLite; индекс
+(user_id, due) служит очередью с приоритетом: ближайшие к повторению карточки
+пользователя выбираются за O(log n) независимо от общего числа карточек.
+"""
+
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+DAY = 24 * 3600
+# Оценки интерфейса: 0 — забыл, 1 — трудно, 2 — нормально, 3 — легко.
+# В SM-2 им соответствует качество ответа 0–5 (меньше 3 — ответ не вспомнен)
+GRADE_QUALITY = {0: 1, 1: 3, 2: 4, 3: 5}
+DEFAULT_EASE = 2.5
+MIN_EASE = 1.3
+
+
+def sm2(
+    repetitions: int, interval: float, ease: float, grade: int
+) -> Tuple[int, float, float, bool]:
+    """
+    Шаг SM-2: (повторений подряд, интервал в днях, фактор лёгкости, забыта ли выученная карточка).
+    """
+    quality = GRADE_QUALITY[grade]
+    lapsed = quality < 3 and repetitions > 0
+    if quality < 3:
+        repetitions, interval = 0, 1.0
+    else:
+        if repetitions == 0:
+            interval = 1.0
+        elif repetitions == 1:
+            interval = 6.0
+        else:
+            interval = round(interval * ease, 2)
+        repetitions += 1
+    ease = max(MIN_EASE, ease + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+    return repetitions, interval, round(ease, 3), lapsed
+
+
+class ReviewStore:
+    """Состояние повторения карточек по пользователям с очередью ближайших повторений."""
+
+    def __init__(self, path: str = "cache/reviews.sqlite3"):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # В WAL синхронизация на каждый коммит не нужна для целостности базы
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS card_reviews (
+                user_id TEXT NOT NULL,
+                card_id TEXT NOT NULL,
+                repetitions INTEGER NOT NULL,
+                interval REAL NOT NULL,
+                ease REAL NOT NULL,
+                lapses INTEGER NOT NULL,
+                reviews INTEGER NOT NULL,
+                last_review REAL NOT NULL,
+                due REAL NOT NULL,
+                PRIMARY KEY (user_id, card_id)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS idx_card_reviews_due ON card_reviews(user_id, due);
+            """
+        )
+        self._conn.commit()
+
+    def review_many(
+        self, user_id: str, reviews: Iterable[Tuple[str, int, Optional[float]]]
+    ) -> List[Dict[str, Any]]:
+        """
+        Применяет пачку оценок (card_id, оценка 0–3, время или None = сейчас) одной транзакцией;
+        оценки без времени идут в порядке пачки после оценок со временем.
+        Новая карточка начинает с состояния по умолчанию. Оценка не новее последнего
+        повторения карточки (повтор пачки через sendBeacon, опоздавший запрос) пропускается.
+        Возвращает текущие состояния карточек пачки.
+        """
+        now = time.time()
+        # Оценки одной карточки применяются в порядке времени; будущее время — это "сейчас".
+        # Оценки без времени получают возрастающие отметки в порядке пачки, иначе
+        # все они, кроме первой, оказались бы не новее предыдущей и пропускались
+        ordered = sorted(
+            (
+                (card_id, grade, now + i * 1e-6 if reviewed_at is None else min(reviewed_at, now))
+                for i, (card_id, grade, reviewed_at) in enumerate(reviews)
+            ),
+            key=lambda review: review[2],
+        )
+        card_ids = list({card_id for card_id, _, _ in ordered})
+        if not card_ids:
+            return []
+
+        with self._lock:
+            states: Dict[str, List] = {}
+            for start in range(0, len(card_ids), 500):
+                chunk = card_ids[start : start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                for row in self._conn.execute(
+                    "SELECT card_id, repetitions, interval, ease, lapses, reviews, last_review "
+                    f"FROM card_reviews WHERE user_id = ? AND card_id IN ({placeholders})",
+                    [user_id, *chunk],
+                ):
+                    states[row[0]] = list(row[1:])
+
+            changed = set()
+            for card_id, grade, reviewed_at in ordered:
+                repetitions, interval, ease, lapses, count, last_review = states.get(
+                    card_id, [0, 0.0, DEFAULT_EASE, 0, 0, 0.0]
+                )
+                if reviewed_at <= last_review:
+                    continue
+                repetitions, interval, ease, lapsed = sm2(repetitions, interval, ease, grade)
+                states[card_id] = [
+                    repetitions, interval, ease, lapses + lapsed, count + 1, reviewed_at
+                ]
+                changed.add(card_id)
+
+            rows = [
+                (user_id, card_id, *state, state[-1] + state[1] * DAY)
+                for card_id, state in states.items()
+            ]
+            if changed:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO card_reviews VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [row for row in rows if row[1] in changed],
+                )
+                self._conn.commit()
+        return [_state_dict(row[1:]) for row in rows]
+
+    def due(
+        self, user_id: str, limit: int = 20, now: Optional[float] = None
+    ) -> List[Dict[str, Any]]:
+        """Карточки пользователя, которые пора повторить, начиная с самых просроченных."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT card_id, repetitions, interval, ease, lapses, reviews, last_review, due "
+                "FROM card_reviews WHERE user_id = ? AND due <= ? ORDER BY due LIMIT ?",
+                (user_id, now if now is not None else time.time(), limit),
+            ).fetchall()
+        return [_state_dict(row) for row in rows]
+
+    def stats(self, user_id: str, now: Optional[float] = None) -> Dict[str, Any]:
+        now = now if now is not None else time.time()
+        with self._lock:
+            (cards,) = self._conn.execute(
+                "SELECT COUNT(*) FROM card_reviews WHERE user_id = ?", (user_id,)
+            ).fetchone()
+            (due,) = self._conn.execute(
+                "SELECT COUNT(*) FROM card_reviews WHERE user_id = ? AND due <= ?", (user_id, now)
+            ).fetchone()
+            (next_due,) = self._conn.execute(
+                "SELECT MIN(due) FROM card_reviews WHERE user_id = ? AND due > ?", (user_id, now)
+            ).fetchone()
+        return {"cards": cards, "due": due, "next_due": next_due}
+
+
+def _state_dict(row) -> Dict[str, Any]:
+    card_id, repetitions, interval, ease, lapses, reviews, last_review, due = row
+    return {
+        "card_id": card_id,
+        "repetitions": repetitions,
+        "interval_days": interval,
+        "ease": ease,
+        "lapses": lapses,
+        "reviews": reviews,
+        "last_review": last_review,
+        "due": due,
+    }
@@ -0,0 +1,146 @@
+"""
+LearnGame AI - Раздача фронтенда из памяти
+Файлы frontend/ читаются один раз при старте вместе с заранее сжатыми вариантами
+gzip/brotli. Ссылки в index.html заменяются на адреса с хэшем содержимого
+(/static/app.3f2a9c1b.js), которые кэшируются браузером навсегда (immutable).
+"""
+
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+from fastapi import Request
+from fastapi.responses import Response
+
+from responses import MINIMUM_SIZE, brotli, choose_encoding, etag_matches
+
+logger = logging.getLogger(__name__)
+
+# Типы, которые имеет смысл сжимать (картинки и шрифты уже сжаты)
+COMPRESSIBLE_TYPES = ("text/", "application/javascript", "application/json", "image/svg+xml")
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+
+
+@dataclass
+class Asset:
+    """Файл фронтенда со всеми вариантами тела."""
+
+    name: str
+    media_type: str
+    digest: str
+    bodies: Dict[Optional[str], bytes] = field(default_factory=dict)
+
+    @property
+    def hashed_name(self) -> str:
+        stem, dot, ext = self.name.rpartition(".")
+        return f"{stem}.{self.digest}.{ext}" if dot else f"{self.name}.{self.digest}"
+
+
+def _media_type(name: str) -> str:
+    media_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+    if media_type.startswith("text/") or media_type == "application/javascript":
+        media_type += "; charset=utf-8"
+    return media_type
+
+
+def _make_asset(name: str, body: bytes) -> Asset:
+    media_type = _media_type(name)
+    asset = Asset(name, media_type, hashlib.sha256(body).hexdigest()[:10], {None: body})
+    if len(body) >= MINIMUM_SIZE and media_type.startswith(COMPRESSIBLE_TYPES):
+        # Сжимаем один раз, поэтому с максимальным уровнем
+        variants = {"gzip": gzip.compress(body, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            variants["br"] = brotli.compress(body, quality=11)
+        for encoding, compressed in variants.items():
+            if len(compressed) < len(body):
+                asset.bodies[encoding] = compressed
+    return asset
+
+
+class StaticAssets:
+    """
+    Фронтенд в памяти: index.html и /static/* отдаются без обращений к диску,
+    с ETag, 304 и сжатым вариантом по Accept-Encoding.
+    reload=True (режим разработки) перечитывает файлы, если они изменились.
+    """
+
+    def __init__(self, directory: str, prefix: str = "/static", reload: bool = False):
+        self.directory = directory
+        self.prefix = prefix
+        self.reload = reload
+        self._assets: Dict[str, Asset] = {}
+        self._hashed: Dict[str, Asset] = {}
+        self._mtimes: Dict[str, float] = {}
+
+    def load(self) -> int:
+        """Читает все файлы каталога; возвращает их число (0, если каталога нет)."""
+        assets: Dict[str, Asset] = {}
+        mtimes: Dict[str, float] = {}
+        if os.path.isdir(self.directory):
+            for root, _, files in os.walk(self.directory):
+                for filename in files:
+                    path = os.path.join(root, filename)
+                    name = os.path.relpath(path, self.directory).replace(os.sep, "/")
+                    with open(path, "rb") as f:
+                        assets[name] = _make_asset(name, f.read())
+                    mtimes[path] = os.path.getmtime(path)
+        else:
+            logger.warning("Папка frontend не найдена: %s", self.directory)
+
+        index = assets.get("index.html")
+        if index is not None:
+            assets["index.html"] = _make_asset("index.html", self._link_hashed(index, assets))
+        self._assets = assets
+        self._hashed = {asset.hashed_name: asset for asset in assets.values()}
+        self._mtimes = mtimes
+        return len(assets)
+
+    def _link_hashed(self, index: Asset, assets: Dict[str, Asset]) -> bytes:
+        """Подставляет в index.html адреса с хэшем вместо /static/<имя>."""
+        html = index.bodies[None].decode("utf-8")
+
+        def replace(match: "re.Match") -> str:
+            asset = assets.get(match.group(1))
+            return f"{self.prefix}/{asset.hashed_name}" if asset else match.group(0)
+
+        pattern = re.escape(self.prefix) + r"/([\w./-]+)"
+        return re.sub(pattern, replace, html).encode("utf-8")
+
+    def _changed(self) -> bool:
+        try:
+            current = {path: os.path.getmtime(path) for path in self._mtimes}
+        except OSError:
+            return True
+        return current != self._mtimes
+
+    def response(self, request: Request, name: str) -> Optional[Response]:
+        """
+        Ответ для файла name (обычного или с хэшем в имени); None, если файла нет.
+        Адреса с хэшем кэшируются навсегда, остальные — с проверкой по ETag.
+        """
+        if self.reload and self._changed():
+            self.load()
+        asset = self._hashed.get(name)
+        cache_control = IMMUTABLE
+        if asset is None:
+            asset = self._assets.get(name)
+            cache_control = REVALIDATE
+        if asset is None:
+            return None
+
+        encoding = choose_encoding(request.headers.get("accept-encoding", ""))
+        if encoding not in asset.bodies:
+            encoding = None
+        etag = f'"{asset.digest}-{encoding}"' if encoding else f'"{asset.digest}"'
+        headers = {"ETag": etag, "Cache-Control": cache_control, "Vary": "Accept-Encoding"}
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
+        if encoding:
+            headers["Content-Encoding"] = encoding
+        return Response(asset.bodies[encoding], media_type=asset.media_type, headers=headers)
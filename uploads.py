@@ -0,0 +1,214 @@
+"""
+LearnGame AI - Приём загружаемых файлов
+Файл пишется на диск кусками с подсчётом SHA-256 и лимитом размера, не читаясь
+целиком в память; materials/ чистится по возрасту файлов и общему объёму.
+"""
+
+import hashlib
+import os
+import re
+import tempfile
+import time
+import zipfile
+from pathlib import Path
+from typing import IO, Iterable, List, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+
+CHUNK_SIZE = 1024 * 1024
+# Файлы моложе этого возраста не вытесняются по объёму: они могут обрабатываться прямо сейчас
+MIN_EVICTION_AGE = 600
+
+
+class UploadTooLargeError(Exception):
+    """Загружаемый файл больше допустимого размера."""
+
+
+def sanitize_filename(name: str) -> str:
+    """Имя файла для отображения: без каталогов и управляющих символов, не длиннее 200."""
+    name = Path(str(name or "").replace("\\", "/")).name
+    name = re.sub(r"[\x00-\x1f\x7f]", "", name).strip()
+    return name[:200] or "document.pdf"
+
+
+def _open_part(directory: str) -> IO[bytes]:
+    os.makedirs(directory, exist_ok=True)
+    return tempfile.NamedTemporaryFile(dir=directory, suffix=".part", delete=False)
+
+
+def _commit_part(
+    part_path: str, directory: str, doc_hash: str, suffix: str
+) -> Tuple[str, bool]:
+    """
+    Переименовывает временный файл в materials/<sha256><suffix>.
+    Возвращает (путь, создан ли файл): файл с тем же содержимым мог уже лежать
+    в directory — его читает другой запрос, и удалять его нельзя.
+    """
+    path = os.path.join(directory, f"{doc_hash}{suffix}")
+    created = not os.path.exists(path)
+    os.replace(part_path, path)
+    return path, created
+
+
+def _discard(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+async def save_upload(
+    upload, directory: str = "materials", max_bytes: int = 50 * 1024 * 1024, suffix: str = ".pdf"
+) -> Tuple[str, str, bool]:
+    """
+    Потоково сохраняет UploadFile в directory под именем по SHA-256 содержимого.
+    Возвращает (путь, хэш, создан ли файл этим вызовом).
+    Бросает UploadTooLargeError при превышении max_bytes.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    part = await run_in_threadpool(_open_part, directory)
+    try:
+        while True:
+            chunk = await upload.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_bytes:
+                raise UploadTooLargeError(
+                    f"Файл больше {max_bytes // (1024 * 1024)} МБ"
+                )
+            digest.update(chunk)
+            await run_in_threadpool(part.write, chunk)
+        await run_in_threadpool(part.close)
+    except BaseException:
+        part.close()
+        await run_in_threadpool(_discard, part.name)
+        raise
+
+    doc_hash = digest.hexdigest()
+    path, created = await run_in_threadpool(
+        _commit_part, part.name, directory, doc_hash, suffix
+    )
+    return path, doc_hash, created
+
+
+def discard_files(paths: Iterable[str], keep: Iterable[str] = ()) -> int:
+    """Удаляет файлы paths, кроме keep; возвращает число удалённых."""
+    keep = {os.path.abspath(path) for path in keep}
+    removed = 0
+    for path in set(paths):
+        if os.path.abspath(path) not in keep and os.path.exists(path):
+            _discard(path)
+            removed += 1
+    return removed
+
+
+def hash_file(path: str) -> str:
+    """SHA-256 файла, читаемого кусками."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def extract_zip_pdfs(
+    zip_path: str,
+    directory: str = "materials",
+    max_bytes: int = 50 * 1024 * 1024,
+    max_files: int = 100,
+    max_total_bytes: int = 500 * 1024 * 1024,
+) -> List[Tuple[str, str, str, bool]]:
+    """
+    Распаковывает PDF из архива потоково, каждый с лимитом max_bytes.
+    Возвращает [(имя, путь, хэш, создан ли файл)]; слишком большие файлы пропускаются.
+    Бросает UploadTooLargeError, если PDF в архиве больше max_files или вместе они
+    больше max_total_bytes; распакованные до этого файлы удаляются.
+    """
+    documents = []
+    created = []
+    total = 0
+    with zipfile.ZipFile(zip_path) as archive:
+        members = [
+            info
+            for info in archive.infolist()
+            if not info.is_dir()
+            and info.filename.lower().endswith(".pdf")
+            and info.file_size <= max_bytes
+        ]
+        # Проверяем до распаковки: архив из тысяч записей не должен успеть заполнить диск
+        if len(members) > max_files:
+            raise UploadTooLargeError(
+                f"Слишком много файлов в архиве: {len(members)} (максимум {max_files})"
+            )
+        try:
+            for info in members:
+                digest = hashlib.sha256()
+                size = 0
+                part = _open_part(directory)
+                with part, archive.open(info) as source:
+                    for chunk in iter(lambda: source.read(CHUNK_SIZE), b""):
+                        size += len(chunk)
+                        if size > max_bytes or total + size > max_total_bytes:
+                            break
+                        digest.update(chunk)
+                        part.write(chunk)
+                if size > max_bytes:
+                    _discard(part.name)
+                    continue
+                if total + size > max_total_bytes:
+                    _discard(part.name)
+                    raise UploadTooLargeError(
+                        f"Архив больше {max_total_bytes // (1024 * 1024)} МБ после распаковки"
+                    )
+                total += size
+                doc_hash = digest.hexdigest()
+                path, new = _commit_part(part.name, directory, doc_hash, ".pdf")
+                if new:
+                    created.append(path)
+                documents.append((sanitize_filename(info.filename), path, doc_hash, new))
+        except BaseException:
+            for path in created:
+                _discard(path)
+            raise
+    return documents
+
+
+def cleanup_materials(
+    directory: str = "materials",
+    max_age: float = 24 * 3600,
+    max_bytes: int = 2 * 1024 ** 3,
+    keep: Iterable[str] = (),
+) -> int:
+    """
+    Удаляет файлы старше max_age секунд, затем самые старые, пока общий объём
+    больше max_bytes. Файлы из keep (ждут обработки в очереди) не трогаются.
+    Возвращает число удалённых файлов.
+    """
+    if not os.path.isdir(directory):
+        return 0
+    keep = {os.path.abspath(path) for path in keep}
+    now = time.time()
+    removed = 0
+    files = []
+    for entry in os.scandir(directory):
+        if not entry.is_file() or os.path.abspath(entry.path) in keep:
+            continue
+        stat = entry.stat()
+        if now - stat.st_mtime > max_age:
+            _discard(entry.path)
+            removed += 1
+        else:
+            files.append((stat.st_mtime, stat.st_size, entry.path))
+
+    total = sum(size for _, size, _ in files)
+    for mtime, size, path in sorted(files):
+        if total <= max_bytes:
+            break
+        if now - mtime < MIN_EVICTION_AGE:
+            continue
+        _discard(path)
+        total -= size
+        removed += 1
+    return removed